@@ -0,0 +1,134 @@
+"""
+Ресурсы контейнера напрямую из cgroup v2 и /proc
+CPU — cpu.stat, память — memory.current/memory.max, сеть — /proc/<pid>/net/dev;
+скорости считаются по разнице между замерами, без docker stats и подпроцессов
+"""
+
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+def read_cpu_usage(path: str) -> int:
+    """usage_usec из cpu.stat"""
+    with open(path) as f:
+        for line in f:
+            key, _, value = line.partition(" ")
+            if key == "usage_usec":
+                return int(value)
+    raise ValueError(f"{path}: нет usage_usec")
+
+
+def read_int(path: str) -> Optional[int]:
+    """Число из файла cgroup; None для значения max"""
+    with open(path) as f:
+        value = f.read().strip()
+    return None if value == "max" else int(value)
+
+
+def read_pids(path: str) -> List[int]:
+    """PID процессов из cgroup.procs (видимые в нашем пространстве имен)"""
+    with open(path) as f:
+        return [int(line) for line in f if line.strip()]
+
+
+def read_net_dev(path: str) -> Tuple[int, int]:
+    """Суммарные (принято, отправлено) байт по интерфейсам, кроме lo"""
+    rx = tx = 0
+    with open(path) as f:
+        for line in f:
+            name, sep, data = line.partition(":")
+            if not sep or name.strip() == "lo":
+                continue
+            fields = data.split()
+            if len(fields) >= 9:
+                rx += int(fields[0])
+                tx += int(fields[8])
+    return rx, tx
+
+
+class CgroupStats:
+    """Замеры одного контейнера; resolve() возвращает (id контейнера, pid)
+
+    Каталог cgroup ищется по /proc/<pid>/cgroup, а если pid из другого
+    пространства имен — по известным раскладкам драйверов systemd и cgroupfs.
+    """
+
+    def __init__(self, resolve: Callable[[], Optional[Tuple[str, int]]],
+                 cgroup_root: str = "/sys/fs/cgroup", proc_root: str = "/proc"):
+        self._resolve = resolve
+        self.cgroup_root = cgroup_root
+        self.proc_root = proc_root
+        self._path: Optional[str] = None
+        self._pid = 0
+        self._previous: Optional[Tuple[float, int, Optional[Tuple[int, int]]]] = None
+        self._lock = threading.Lock()
+
+    def _locate(self) -> bool:
+        """Найти каталог cgroup контейнера (после перезапуска — заново)"""
+        resolved = self._resolve()
+        if not resolved:
+            return False
+        container_id, pid = resolved
+        candidates = []
+        try:
+            with open(os.path.join(self.proc_root, str(pid), "cgroup")) as f:
+                for line in f:
+                    if line.startswith("0::"):
+                        candidates.append(self.cgroup_root + line[3:].strip())
+        except OSError:
+            pass
+        candidates += [
+            os.path.join(self.cgroup_root, "system.slice", f"docker-{container_id}.scope"),
+            os.path.join(self.cgroup_root, "docker", container_id),
+        ]
+        for path in candidates:
+            if os.path.exists(os.path.join(path, "cpu.stat")):
+                self._path, self._pid, self._previous = path, pid, None
+                return True
+        return False
+
+    def sample(self, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Текущий замер; None, если cgroup контейнера не найден"""
+        with self._lock:
+            for attempt in range(2):
+                if self._path is None and not self._locate():
+                    return None
+                try:
+                    return self._read(now or time.monotonic())
+                except (OSError, ValueError):
+                    # Контейнер пересоздан или остановлен — ищем cgroup заново
+                    self._path = None
+            return None
+
+    def _read(self, now: float) -> Dict[str, Any]:
+        cpu = read_cpu_usage(os.path.join(self._path, "cpu.stat"))
+        memory = read_int(os.path.join(self._path, "memory.current"))
+        try:
+            limit = read_int(os.path.join(self._path, "memory.max"))
+        except OSError:
+            limit = None
+        # Без pid: host процессы контейнера в cgroup.procs не видны (пусто или нули),
+        # тогда сеть не показываем. Если видны, но нашего PID среди них нет — контейнер
+        # перезапущен, и sample() ищет его заново (PID мог достаться чужому процессу)
+        pids = [pid for pid in read_pids(os.path.join(self._path, "cgroup.procs")) if pid]
+        net: Optional[Tuple[int, int]] = None
+        if pids:
+            if self._pid not in pids:
+                raise ValueError(f"PID {self._pid} больше не в cgroup контейнера")
+            net = read_net_dev(os.path.join(self.proc_root, str(self._pid), "net", "dev"))
+        result: Dict[str, Any] = {
+            "cpu_percent": None, "memory": memory, "memory_limit": limit,
+            "rx_rate": None, "tx_rate": None,
+        }
+        previous = self._previous
+        self._previous = (now, cpu, net)
+        if previous is not None and now > previous[0]:
+            elapsed = now - previous[0]
+            # Процент одного ядра, как в docker stats
+            result["cpu_percent"] = max(cpu - previous[1], 0) / (elapsed * 1_000_000) * 100
+            if net is not None and previous[2] is not None:
+                result["rx_rate"] = max(net[0] - previous[2][0], 0) / elapsed
+                result["tx_rate"] = max(net[1] - previous[2][1], 0) / elapsed
+        return result
@@ -0,0 +1,103 @@
+"""
+Фоновый сбор статуса сервера
+Держит последний снимок с отметкой времени, чтобы /status отвечал сразу
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def format_bytes(value: float) -> str:
+    """Человекочитаемый размер в стиле free -h / df -h"""
+    if value < 1024:
+        return f"{value:.0f}B"
+    for unit in ("K", "M", "G"):
+        value /= 1024
+        if value < 1024:
+            return f"{value:.1f}{unit}"
+    return f"{value / 1024:.1f}T"
+
+
+def read_meminfo(path: str = "/proc/meminfo") -> Dict[str, int]:
+    """Прочитать /proc/meminfo в байтах"""
+    info = {}
+    with open(path) as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            parts = rest.split()
+            if parts:
+                info[key] = int(parts[0]) * 1024
+    return info
+
+
+def memory_usage() -> Optional[tuple]:
+    """(использовано, всего) памяти в байтах, как used у free"""
+    info = read_meminfo()
+    total = info.get("MemTotal", 0)
+    available = info.get("MemAvailable", info.get("MemFree", 0))
+    return (total - available, total) if total else None
+
+
+def disk_usage(path: str = "/") -> tuple:
+    """(использовано, всего) байт файловой системы, как у df"""
+    st = os.statvfs(path)
+    total = st.f_blocks * st.f_frsize
+    used = (st.f_blocks - st.f_bfree) * st.f_frsize
+    return used, total
+
+
+class StatusCollector:
+    """Периодически обновляет снимок статуса в фоновом потоке"""
+
+    def __init__(self, collect: Callable[[], Dict[str, Any]], interval: float = 30):
+        self._collect = collect
+        self.interval = interval
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._collect_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Запустить фоновый сбор"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopped = False
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped = True
+        self._wakeup.set()
+
+    def snapshot(self) -> Optional[Dict[str, Any]]:
+        """Последний снимок (None, если сбор еще не выполнялся)"""
+        return self._snapshot
+
+    def refresh(self) -> Dict[str, Any]:
+        """Собрать новый снимок; параллельные вызовы разделяют один сбор"""
+        requested_at = time.time()
+        with self._collect_lock:
+            snapshot = self._snapshot
+            if snapshot and snapshot["started_at"] >= requested_at:
+                return snapshot
+            started_at = time.time()
+            snapshot = dict(self._collect())
+            snapshot["started_at"] = started_at
+            snapshot["collected_at"] = time.time()
+            self._snapshot = snapshot
+            return snapshot
+
+    def _loop(self):
+        while not self._stopped:
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Ошибка сбора статуса: {e}")
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
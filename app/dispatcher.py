@@ -0,0 +1,111 @@
+"""
+Выполнение долгих команд бота в ограниченном пуле потоков
+Повторные нажатия той же команды присоединяются к уже идущему запуску
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+STARTED = "started"
+MERGED = "merged"
+BUSY = "busy"
+
+
+class Dispatcher:
+    """Пул для долгих команд с объединением повторных запусков"""
+
+    def __init__(self, max_workers: int = 2, max_pending: int = 8):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="command")
+        self._max_pending = max_pending
+        # Ключ команды -> чаты, ожидающие результат
+        self._waiters: Dict[str, List[int]] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key: str, chat_id: int, func: Callable[[], str],
+               reply: Callable[[int, str], Any], ack_text: str,
+               notify: Optional[Callable[[int, str], Any]] = None) -> str:
+        """Запустить команду или присоединиться к идущей; вернуть STARTED/MERGED/BUSY
+
+        reply получает результат команды, notify — служебные подтверждения
+        (по умолчанию тот же reply).
+        """
+        notify = notify or reply
+        with self._lock:
+            waiters = self._waiters.get(key)
+            if waiters is not None:
+                if chat_id not in waiters:
+                    waiters.append(chat_id)
+                state = MERGED
+            elif len(self._waiters) >= self._max_pending:
+                state = BUSY
+            else:
+                self._waiters[key] = [chat_id]
+                state = STARTED
+
+        if state == MERGED:
+            notify(chat_id, "⏳ Команда уже выполняется, результат придет сюда")
+        elif state == BUSY:
+            notify(chat_id, "⏳ Бот занят другими командами, повторите позже")
+        else:
+            # Подтверждение отправляем до запуска, чтобы оно не пришло после результата
+            notify(chat_id, ack_text)
+            self._executor.submit(self._run, key, func, reply)
+        return state
+
+    def run(self, key: str, chat_id: int, func: Callable[[], Any],
+            notify: Callable[[int, str], Any]) -> str:
+        """Выполнить действие в пуле без подтверждения (оно само отвечает пользователю)
+
+        Ключ учитывается отдельно для каждого чата: повторное нажатие, пока действие
+        идет, не запускает его второй раз, а notify сообщает об этом.
+        """
+        key = f"{key}:{chat_id}"
+        with self._lock:
+            if key in self._waiters:
+                state = MERGED
+            elif len(self._waiters) >= self._max_pending:
+                state = BUSY
+            else:
+                self._waiters[key] = []
+                state = STARTED
+        if state == MERGED:
+            notify(chat_id, "⏳ Команда уже выполняется")
+        elif state == BUSY:
+            notify(chat_id, "⏳ Бот занят другими командами, повторите позже")
+        else:
+            self._executor.submit(self._run, key, lambda: self._guarded(chat_id, func, notify), None)
+        return state
+
+    @staticmethod
+    def _guarded(chat_id: int, func: Callable[[], Any], notify: Callable[[int, str], Any]):
+        """Действие отвечает само, поэтому о непредвиденной ошибке сообщаем за него"""
+        try:
+            func()
+        except Exception as e:
+            logger.error(f"Ошибка выполнения действия в чате {chat_id}: {e}")
+            notify(chat_id, f"❌ Ошибка: {str(e)}")
+
+    def _run(self, key: str, func: Callable[[], str], reply: Optional[Callable[[int, str], Any]]):
+        try:
+            with metrics.COMMAND_SECONDS.time(key.split(":", 1)[0]):
+                result = func()
+        except Exception as e:
+            logger.error(f"Ошибка выполнения команды {key}: {e}")
+            result = f"❌ Ошибка: {str(e)}"
+        # Снимаем ключ до отправки: новые нажатия после этого запустят новую команду
+        with self._lock:
+            chats = self._waiters.pop(key, [])
+        if reply is None:
+            return
+        for chat_id in chats:
+            reply(chat_id, result)
+
+    def shutdown(self):
+        """Остановить пул, не дожидаясь долгих команд"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,312 @@
+"""
+Минимальный клиент Docker Engine API поверх unix-сокета
+Держит небольшой пул keep-alive соединений и заменяет вызовы docker CLI без fork/exec
+"""
+
+import calendar
+import http.client
+import json
+import os
+import socket
+import struct
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote, urlencode
+
+DEFAULT_SOCKET = "/var/run/docker.sock"
+POOL_SIZE = 4  # сколько простаивающих соединений держать открытыми
+
+
+class DockerError(Exception):
+    """Ошибка обращения к Docker Engine API"""
+
+    def __init__(self, message: str, status: int = 0):
+        super().__init__(message)
+        self.status = status
+
+
+class DockerTimeout(DockerError):
+    """Демон не ответил за отведенное время: сокет доступен, повтор через CLI не поможет"""
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTP-соединение через unix-сокет"""
+
+    def __init__(self, path: str, timeout: float):
+        super().__init__("localhost", timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.unix_path)
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+
+
+def _demux(raw: bytes) -> bytes:
+    """Склеить stdout/stderr из мультиплексированного потока (Tty=false)"""
+    out = []
+    pos = 0
+    while pos + 8 <= len(raw):
+        size = struct.unpack(">I", raw[pos + 4:pos + 8])[0]
+        out.append(raw[pos + 8:pos + 8 + size])
+        pos += 8 + size
+    return b"".join(out)
+
+
+def _unix_since(timestamp: str) -> str:
+    """RFC3339 (как в выводе --timestamps) -> секунды.наносекунды для параметра since"""
+    if "T" not in timestamp:
+        return timestamp
+    base, _, fraction = timestamp.rstrip("Z").partition(".")
+    fraction = fraction.split("+", 1)[0].split("-", 1)[0]
+    seconds = calendar.timegm(time.strptime(base[:19], "%Y-%m-%dT%H:%M:%S"))
+    return f"{seconds}.{fraction.ljust(9, '0')[:9]}"
+
+
+class DockerClient:
+    """Клиент Docker Engine API с пулом постоянных соединений
+
+    Проверки из разных потоков идут параллельно: каждый запрос берет свободное
+    соединение из пула или открывает новое, а после ответа возвращает его обратно.
+    """
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET, timeout: float = 5.0,
+                 pool_size: int = POOL_SIZE):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._idle: List[_UnixHTTPConnection] = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> Optional["DockerClient"]:
+        """Создать клиент по DOCKER_HOST; None, если сокет недоступен"""
+        host = os.getenv("DOCKER_HOST", "")
+        if host and not host.startswith("unix://"):
+            return None
+        path = host[len("unix://"):] if host else DEFAULT_SOCKET
+        if not os.path.exists(path):
+            return None
+        return cls(path)
+
+    def close(self):
+        """Закрыть простаивающие соединения пула"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def _acquire(self) -> Tuple[_UnixHTTPConnection, bool]:
+        """Свободное соединение из пула (reused=True) или новое"""
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+        return _UnixHTTPConnection(self.socket_path, self.timeout), False
+
+    def _release(self, conn: _UnixHTTPConnection):
+        with self._lock:
+            if len(self._idle) < self.pool_size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    @staticmethod
+    def _url(path: str, params: Optional[Dict[str, Any]]) -> str:
+        if params:
+            return f"{path}?{urlencode(params)}"
+        return path
+
+    @staticmethod
+    def _encode(body: Optional[Dict[str, Any]]) -> Tuple[Optional[bytes], Dict[str, str]]:
+        if body is None:
+            return None, {}
+        return json.dumps(body).encode(), {"Content-Type": "application/json"}
+
+    @staticmethod
+    def _check(status: int, data: bytes):
+        if status >= 400:
+            try:
+                message = json.loads(data).get("message", "")
+            except ValueError:
+                message = data.decode(errors="replace").strip()
+            raise DockerError(message or f"HTTP {status}", status)
+
+    def _request(self, method: str, path: str, params: Optional[Dict[str, Any]] = None,
+                 body: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None) -> Any:
+        """Выполнить запрос по соединению из пула и вернуть JSON-ответ"""
+        url = self._url(path, params)
+        payload, headers = self._encode(body)
+        # Одна повторная попытка: сервер мог закрыть простаивающее соединение
+        for attempt in (0, 1):
+            conn, reused = self._acquire()
+            try:
+                if conn.sock is None:
+                    conn.connect()
+                conn.sock.settimeout(timeout or self.timeout)
+                conn.request(method, url, body=payload, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                if isinstance(e, socket.timeout):
+                    raise DockerTimeout(f"Docker API не ответил за {timeout or self.timeout:g} с") from e
+                if reused and attempt == 0:
+                    # Остальные простаивающие соединения, скорее всего, тоже закрыты сервером
+                    self.close()
+                    continue
+                raise DockerError(f"Docker API недоступен: {e}") from e
+            if response.will_close:
+                conn.close()
+            else:
+                self._release(conn)
+            break
+        self._check(response.status, data)
+        if not data:
+            return None
+        try:
+            return json.loads(data)
+        except ValueError:
+            return data
+
+    def _open_stream(self, method: str, path: str, params: Optional[Dict[str, Any]] = None,
+                     body: Optional[Dict[str, Any]] = None,
+                     timeout: Optional[float] = None) -> Tuple[_UnixHTTPConnection, http.client.HTTPResponse]:
+        """Открыть отдельное соединение под потоковый ответ (exec, события, логи)"""
+        conn = _UnixHTTPConnection(self.socket_path, timeout or self.timeout)
+        payload, headers = self._encode(body)
+        try:
+            conn.request(method, self._url(path, params), body=payload, headers=headers)
+            response = conn.getresponse()
+        except (OSError, http.client.HTTPException) as e:
+            conn.close()
+            if isinstance(e, socket.timeout):
+                raise DockerTimeout(f"Docker API не ответил за {timeout or self.timeout:g} с") from e
+            raise DockerError(f"Docker API недоступен: {e}") from e
+        if response.status >= 400:
+            data = response.read()
+            conn.close()
+            self._check(response.status, data)
+        return conn, response
+
+    def ping(self) -> bool:
+        """Проверить доступность демона"""
+        try:
+            return self._request("GET", "/_ping", timeout=2) in (b"OK", "OK")
+        except DockerError:
+            return False
+
+    def list_containers(self, name: Optional[str] = None, all: bool = False,
+                        timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Список контейнеров (аналог docker ps --filter name=...)"""
+        params: Dict[str, Any] = {"all": "1" if all else "0"}
+        if name:
+            params["filters"] = json.dumps({"name": [name]})
+        return self._request("GET", "/containers/json", params, timeout=timeout) or []
+
+    def container_status(self, name: str, timeout: Optional[float] = None) -> str:
+        """Строка статуса как у docker ps --format {{.Status}}; пустая, если не запущен"""
+        containers = self.list_containers(name, timeout=timeout)
+        # Фильтр name ищет подстроку, поэтому предпочитаем точное совпадение имени
+        for container in containers:
+            if f"/{name}" in container.get("Names", []):
+                return container.get("Status", "")
+        return containers[0].get("Status", "") if containers else ""
+
+    def inspect_container(self, name: str) -> Dict[str, Any]:
+        """Подробная информация о контейнере"""
+        return self._request("GET", f"/containers/{quote(name)}/json")
+
+    def restart_container(self, name: str, stop_timeout: int = 10):
+        """Перезапустить контейнер"""
+        self._request("POST", f"/containers/{quote(name)}/restart",
+                      {"t": stop_timeout}, timeout=stop_timeout + 50)
+
+    def exec_run(self, name: str, cmd: List[str], timeout: float = 5.0) -> Tuple[int, str]:
+        """Выполнить команду в контейнере; вернуть (код возврата, вывод)"""
+        deadline = time.monotonic() + timeout
+        created = self._request("POST", f"/containers/{quote(name)}/exec", body={
+            "Cmd": cmd, "AttachStdout": True, "AttachStderr": True, "Tty": False,
+        }, timeout=timeout)
+        exec_id = created["Id"]
+        conn, response = self._open_stream("POST", f"/exec/{exec_id}/start",
+                                           body={"Detach": False, "Tty": False}, timeout=timeout)
+        try:
+            raw = response.read()
+        except (OSError, http.client.HTTPException) as e:
+            if isinstance(e, socket.timeout):
+                raise DockerTimeout(f"Команда в контейнере не завершилась за {timeout:g} с") from e
+            raise DockerError(f"Ошибка чтения вывода exec: {e}") from e
+        finally:
+            conn.close()
+        # После закрытия потока код возврата появляется не мгновенно
+        while True:
+            info = self._request("GET", f"/exec/{exec_id}/json", timeout=timeout)
+            if not info.get("Running") or time.monotonic() >= deadline:
+                break
+            time.sleep(0.02)
+        exit_code = info.get("ExitCode")
+        return (exit_code if exit_code is not None else -1), _demux(raw).decode(errors="replace")
+
+    def logs(self, name: str, since: Optional[str] = None, tail: Optional[int] = None,
+             follow: bool = True, read_timeout: Optional[float] = None) -> Iterator[str]:
+        """Строки лога контейнера с метками времени; при follow — поток без таймаута"""
+        tty = self.inspect_container(name).get("Config", {}).get("Tty", False)
+        params: Dict[str, Any] = {
+            "stdout": 1, "stderr": 1, "timestamps": 1,
+            "follow": 1 if follow else 0,
+            "tail": "all" if tail is None else tail,
+        }
+        if since:
+            params["since"] = _unix_since(since)
+        conn, response = self._open_stream("GET", f"/containers/{quote(name)}/logs", params)
+        try:
+            conn.sock.settimeout(read_timeout)
+            if tty:
+                while True:
+                    line = response.readline()
+                    if not line:
+                        return
+                    yield line.rstrip(b"\r\n").decode(errors="replace")
+            # Без TTY поток мультиплексирован: заголовок кадра 8 байт, затем данные
+            pending = b""
+            while True:
+                header = response.read(8)
+                if len(header) < 8:
+                    break
+                pending += response.read(struct.unpack(">I", header[4:8])[0])
+                *lines, pending = pending.split(b"\n")
+                for line in lines:
+                    yield line.rstrip(b"\r").decode(errors="replace")
+            if pending:
+                yield pending.decode(errors="replace")
+        except (OSError, http.client.HTTPException) as e:
+            raise DockerError(f"Поток логов прерван: {e}") from e
+        finally:
+            conn.close()
+
+    def events(self, filters: Dict[str, List[str]], since: Optional[int] = None,
+               read_timeout: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        """Подписаться на поток /events; по умолчанию ждет события без таймаута"""
+        params: Dict[str, Any] = {"filters": json.dumps(filters)}
+        if since is not None:
+            params["since"] = since
+        conn, response = self._open_stream("GET", "/events", params)
+        try:
+            conn.sock.settimeout(read_timeout)
+            while True:
+                line = response.readline()
+                if not line:
+                    return
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+        except (OSError, http.client.HTTPException, ValueError) as e:
+            raise DockerError(f"Поток событий прерван: {e}") from e
+        finally:
+            conn.close()
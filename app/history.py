@@ -0,0 +1,225 @@
+"""
+История проверок и ресурсов хоста фиксированного размера
+Данные сразу агрегируются в поминутные и почасовые кольца на array,
+поэтому расход памяти не зависит от времени работы бота
+"""
+
+import threading
+import time
+from array import array
+from collections import deque
+from typing import Deque, Dict, List, Optional, Sequence
+
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+MINUTE = 60
+HOUR = 3600
+# Паузу между проверками длиннее этой (бот был остановлен) в аптайм не засчитываем
+MAX_PROBE_GAP = 15 * MINUTE
+
+
+class BucketRing:
+    """Кольцо из count корзин шириной width секунд
+
+    Слот корзины — номер интервала по модулю count; устаревший слот
+    обнуляется при первой записи в него, поэтому явная прокрутка не нужна.
+    """
+
+    def __init__(self, width: int, count: int, sums: Sequence[str], maxes: Sequence[str] = ()):
+        self.width = width
+        self.count = count
+        self._keys = array("q", [-1]) * count
+        self._sums = {name: array("d", [0.0]) * count for name in sums}
+        self._maxes = {name: array("d", [0.0]) * count for name in maxes}
+
+    def add(self, ts: float, **values: float):
+        key = int(ts // self.width)
+        slot = key % self.count
+        if self._keys[slot] > key:
+            # Запоздавшая запись для уже перезаписанного интервала
+            return
+        if self._keys[slot] != key:
+            self._keys[slot] = key
+            for column in self._sums.values():
+                column[slot] = 0.0
+            for column in self._maxes.values():
+                column[slot] = 0.0
+        for name, value in values.items():
+            if name in self._sums:
+                self._sums[name][slot] += value
+            if name in self._maxes and value > self._maxes[name][slot]:
+                self._maxes[name][slot] = value
+
+    def add_span(self, start: float, end: float, name: str):
+        """Разнести длительность интервала [start, end) по корзинам, которые он задевает"""
+        while start < end:
+            boundary = min(end, (start // self.width + 1) * self.width)
+            self.add(start, **{name: boundary - start})
+            start = boundary
+
+    def window(self, end_ts: float, buckets: int, group: int = 1) -> List[Optional[Dict[str, float]]]:
+        """Последние buckets корзин, сгруппированные по group; None — нет данных"""
+        last = int(end_ts // self.width)
+        first = last - min(buckets, self.count) + 1
+        result: List[Optional[Dict[str, float]]] = []
+        for start in range(first, last + 1, group):
+            merged: Optional[Dict[str, float]] = None
+            for key in range(start, min(start + group, last + 1)):
+                slot = key % self.count
+                if self._keys[slot] != key:
+                    continue
+                if merged is None:
+                    merged = {name: 0.0 for name in (*self._sums, *self._maxes)}
+                for name, column in self._sums.items():
+                    merged[name] += column[slot]
+                for name, column in self._maxes.items():
+                    merged[name] = max(merged[name], column[slot])
+            result.append(merged)
+        return result
+
+
+def sparkline(values: Sequence[Optional[float]], low: Optional[float] = None,
+              high: Optional[float] = None) -> str:
+    """Строка-спарклайн; пропуски отображаются точкой"""
+    present = [v for v in values if v is not None]
+    if not present:
+        return "·" * len(values)
+    low = min(present) if low is None else low
+    high = max(present) if high is None else high
+    span = high - low
+    chars = []
+    for value in values:
+        if value is None:
+            chars.append("·")
+        elif span <= 0:
+            chars.append(SPARK_CHARS[0])
+        else:
+            index = int((min(max(value, low), high) - low) / span * (len(SPARK_CHARS) - 1) + 0.5)
+            chars.append(SPARK_CHARS[index])
+    return "".join(chars)
+
+
+class TargetHistory:
+    """Результаты проверок одной цели: доступность, задержка, инциденты
+
+    Аптайм считается по времени, а не по числу проверок: результат проверки
+    действует до следующей, поэтому частые перепроверки во время сбоя
+    не занижают доступность.
+    """
+
+    def __init__(self, max_incidents: int = 20):
+        fields = ("probes", "failures", "latency", "up_seconds", "down_seconds")
+        self.minutes = BucketRing(MINUTE, 24 * 60, fields, ("latency_max",))
+        self.hours = BucketRing(HOUR, 7 * 24, fields, ("latency_max",))
+        # [начало, конец или None, причина]
+        self.incidents: Deque[list] = deque(maxlen=max_incidents)
+        self._last_probe: Optional[tuple] = None  # (время, ok) предыдущей проверки
+
+    def record_probe(self, ts: float, ok: bool, latency: float):
+        values = {"probes": 1, "failures": 0 if ok else 1, "latency": latency, "latency_max": latency}
+        self.minutes.add(ts, **values)
+        self.hours.add(ts, **values)
+        if self._last_probe is not None:
+            last_ts, last_ok = self._last_probe
+            if 0 < ts - last_ts <= MAX_PROBE_GAP:
+                name = "up_seconds" if last_ok else "down_seconds"
+                self.minutes.add_span(last_ts, ts, name)
+                self.hours.add_span(last_ts, ts, name)
+        if self._last_probe is None or ts >= self._last_probe[0]:
+            self._last_probe = (ts, ok)
+
+    def record_transition(self, ts: float, ok: bool, reason: str):
+        """Открыть или закрыть инцидент при смене статуса"""
+        open_incident = self.incidents[-1] if self.incidents and self.incidents[-1][1] is None else None
+        if not ok and open_incident is None:
+            self.incidents.append([ts, None, reason])
+        elif ok and open_incident is not None:
+            open_incident[1] = ts
+
+
+class HostHistory:
+    """Загрузка памяти и диска хоста в процентах"""
+
+    def __init__(self):
+        fields = ("samples", "memory", "disk")
+        self.minutes = BucketRing(MINUTE, 24 * 60, fields)
+        self.hours = BucketRing(HOUR, 7 * 24, fields)
+
+    def record(self, ts: float, memory_pct: float, disk_pct: float):
+        values = {"samples": 1, "memory": memory_pct, "disk": disk_pct}
+        self.minutes.add(ts, **values)
+        self.hours.add(ts, **values)
+
+
+# Окна отчета: (подпись, кольцо, число корзин, группировка)
+WINDOWS = (
+    ("1 ч", "minutes", 60, 2),
+    ("24 ч", "hours", 24, 1),
+    ("7 д", "hours", 7 * 24, 6),
+)
+
+
+def _availability(point: Dict[str, float]) -> Optional[float]:
+    """Доля времени в рабочем состоянии; без интервалов — доля успешных проверок"""
+    observed = point["up_seconds"] + point["down_seconds"]
+    if observed:
+        return point["up_seconds"] / observed
+    if point["probes"]:
+        return 1 - point["failures"] / point["probes"]
+    return None
+
+
+class History:
+    """История всех целей и хоста"""
+
+    def __init__(self, target_names: Sequence[str]):
+        self.targets = {name: TargetHistory() for name in target_names}
+        self.host = HostHistory()
+        self._lock = threading.Lock()
+
+    def record_probe(self, name: str, ok: bool, latency: float, ts: Optional[float] = None):
+        with self._lock:
+            self.targets[name].record_probe(ts or time.time(), ok, latency)
+
+    def record_transition(self, name: str, ok: bool, reason: str, ts: Optional[float] = None):
+        with self._lock:
+            self.targets[name].record_transition(ts or time.time(), ok, reason)
+
+    def record_host(self, memory_pct: Optional[float], disk_pct: Optional[float], ts: Optional[float] = None):
+        if memory_pct is None or disk_pct is None:
+            return
+        with self._lock:
+            self.host.record(ts or time.time(), memory_pct, disk_pct)
+
+    def target_windows(self, name: str, now: Optional[float] = None) -> List[Dict]:
+        """Аптайм и ряды задержки/доступности по окнам 1ч/24ч/7д"""
+        now = now or time.time()
+        history = self.targets[name]
+        result = []
+        with self._lock:
+            for label, ring_name, buckets, group in WINDOWS:
+                points = getattr(history, ring_name).window(now, buckets, group)
+                totals = {name: sum(p[name] for p in points if p)
+                          for name in ("probes", "failures", "latency", "up_seconds", "down_seconds")}
+                probes = totals["probes"]
+                uptime = _availability(totals)
+                result.append({
+                    "label": label,
+                    "uptime": uptime * 100 if uptime is not None else None,
+                    "latency_avg": totals["latency"] / probes if probes else None,
+                    "latency": [p["latency"] / p["probes"] if p and p["probes"] else None for p in points],
+                    "availability": [_availability(p) if p else None for p in points],
+                })
+        return result
+
+    def host_window(self, now: Optional[float] = None) -> Dict:
+        """Память и диск за последние 24 часа"""
+        now = now or time.time()
+        with self._lock:
+            points = self.host.hours.window(now, 24)
+        memory = [p["memory"] / p["samples"] if p and p["samples"] else None for p in points]
+        disk = [p["disk"] / p["samples"] if p and p["samples"] else None for p in points]
+        return {"memory": memory, "disk": disk}
+
+    def incidents(self, name: str) -> List[list]:
+        with self._lock:
+            return [list(item) for item in self.targets[name].incidents]
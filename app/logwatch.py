@@ -0,0 +1,200 @@
+"""
+Наблюдение за логом контейнера
+Поток лога читается построчно, последние строки хранятся в кольцевом буфере,
+каждая строка проверяется одним проходом по объединенному регулярному выражению
+"""
+
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+from .sender import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Шаблоны по умолчанию: ошибки приложения wg-easy и WireGuard
+DEFAULT_PATTERNS = {
+    "error": r"\b(?:error|exception|fatal|panic)\b",
+    "wireguard": r"wg-quick|RTNETLINK|Cannot find device|Unable to access interface",
+    "system": r"permission denied|EADDRINUSE|EACCES|out of memory",
+}
+MAX_LINE = 1000
+# Числа, hex-идентификаторы и адреса не должны делать одинаковые ошибки «разными»
+_VOLATILE = re.compile(r"0x[0-9a-f]+|[0-9a-f]{8,}|\d+", re.IGNORECASE)
+
+
+def compile_patterns(patterns: Dict[str, str]) -> re.Pattern:
+    """Объединить шаблоны в одно выражение; имя сработавшего — в lastgroup
+
+    Шаблоны регистронезависимы, собственные именованные группы в них не допускаются.
+    """
+    groups = []
+    for index, pattern in enumerate(patterns.values()):
+        re.compile(pattern)
+        groups.append(f"(?P<p{index}>{pattern})")
+    return re.compile("|".join(groups), re.IGNORECASE)
+
+
+def split_timestamp(raw: str) -> Tuple[str, str]:
+    """Отделить метку времени Docker (--timestamps) от текста строки"""
+    stamp, sep, text = raw.partition(" ")
+    if sep and stamp[:4].isdigit() and "T" in stamp:
+        return stamp, text
+    return "", raw
+
+
+def _stamp_key(stamp: str) -> str:
+    """Метка времени в виде, сравнимом как строка (дробная часть до 9 знаков)"""
+    base, _, fraction = stamp.rstrip("Z").partition(".")
+    return f"{base}.{fraction.ljust(9, '0')}"
+
+
+class _PendingAlert:
+    __slots__ = ("name", "line", "before", "after", "created", "repeats")
+
+    def __init__(self, name: str, line: str, before: List[str], repeats: int):
+        self.name = name
+        self.line = line
+        self.before = before
+        self.after: List[str] = []
+        self.created = time.monotonic()
+        self.repeats = repeats
+
+
+class LogWatcher:
+    """Следит за логом одного контейнера и шлет алерты по совпадениям
+
+    source(since, tail, follow) отдает строки с метками времени. Повторы одной
+    ошибки за cooldown секунд подавляются и учитываются в следующем алерте,
+    всего алертов — не больше rate_per_minute в минуту.
+    """
+
+    def __init__(self, name: str, source: Callable[[Optional[str], Optional[int], bool], Iterator[str]],
+                 on_alert: Callable[[str, str, List[str], List[str], int], None],
+                 patterns: Optional[Dict[str, str]] = None, buffer_lines: int = 500,
+                 context: int = 3, cooldown: float = 300, rate_per_minute: float = 6):
+        self.name = name
+        self._source = source
+        self._on_alert = on_alert
+        patterns = patterns or DEFAULT_PATTERNS
+        self._names = list(patterns)
+        self._regex = compile_patterns(patterns)
+        self.lines: Deque[str] = deque(maxlen=buffer_lines)
+        self.context = context
+        self.cooldown = cooldown
+        self._bucket = TokenBucket(rate_per_minute / 60, max(1.0, rate_per_minute))
+        # ключ ошибки -> (время последнего алерта, подавлено повторов); размер ограничен
+        self._seen: "OrderedDict[Tuple[str, str], List[float]]" = OrderedDict()
+        self._pending: List[_PendingAlert] = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._since: Optional[str] = None
+        self._since_key = ""
+        self._last_raw = ""
+        self.matches = 0
+
+    def start(self):
+        threading.Thread(target=self._loop, daemon=True).start()
+        threading.Thread(target=self._flush_loop, daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def tail(self, count: int) -> List[str]:
+        with self._lock:
+            return list(self.lines)[-count:] if count > 0 else []
+
+    def _loop(self):
+        # История заполняет буфер, но не проверяется: старые ошибки не алертим
+        try:
+            for raw in self._source(None, self.lines.maxlen, False):
+                self._remember(raw)
+        except Exception as e:
+            logger.error(f"Не удалось прочитать лог {self.name}: {e}")
+        while not self._stopped.is_set():
+            try:
+                for raw in self._source(self._since, 0 if self._since is None else None, True):
+                    if self._stopped.is_set():
+                        return
+                    line = self._remember(raw)
+                    if line is not None:
+                        self.feed(line)
+            except Exception as e:
+                logger.error(f"Поток лога {self.name} прерван: {e}")
+            self._stopped.wait(5)
+
+    def _remember(self, raw: str) -> Optional[str]:
+        """Положить строку в буфер; None — строка уже была до переподключения"""
+        if raw == self._last_raw:
+            return None
+        stamp, line = split_timestamp(raw)
+        if stamp:
+            key = _stamp_key(stamp)
+            if key < self._since_key:
+                return None
+            self._since, self._since_key = stamp, key
+        self._last_raw = raw
+        line = line[:MAX_LINE]
+        with self._lock:
+            self.lines.append(line)
+        return line
+
+    def feed(self, line: str):
+        """Проверить новую строку (уже добавленную в буфер)"""
+        with self._lock:
+            for alert in self._pending:
+                alert.after.append(line)
+            ready = [a for a in self._pending if len(a.after) >= self.context]
+            self._pending = [a for a in self._pending if len(a.after) < self.context]
+            match = self._regex.search(line)
+            if match is not None:
+                self.matches += 1
+                name = self._names[int(match.lastgroup[1:])]
+                alert = self._register(name, line)
+                if alert is not None:
+                    if self.context:
+                        self._pending.append(alert)
+                    else:
+                        ready.append(alert)
+        for alert in ready:
+            self._emit(alert)
+
+    def _register(self, name: str, line: str) -> Optional[_PendingAlert]:
+        """Учесть совпадение; вернуть алерт, если он не подавлен"""
+        key = (name, _VOLATILE.sub("#", line))
+        now = time.monotonic()
+        seen = self._seen.get(key)
+        if seen is not None:
+            self._seen.move_to_end(key)
+            if now - seen[0] < self.cooldown or self._bucket.delay(now) > 0:
+                seen[1] += 1
+                return None
+        elif self._bucket.delay(now) > 0:
+            return None
+        self._bucket.consume(now)
+        repeats = int(seen[1]) if seen is not None else 0
+        self._seen[key] = [now, 0]
+        if len(self._seen) > 256:
+            self._seen.popitem(last=False)
+        # Строка уже в буфере последней, контекст до нее — предыдущие
+        before = list(self.lines)[-self.context - 1:-1] if self.context else []
+        return _PendingAlert(name, line, before, repeats)
+
+    def _flush_loop(self):
+        """Не ждать контекст после строки дольше пары секунд"""
+        while not self._stopped.wait(1):
+            now = time.monotonic()
+            with self._lock:
+                ready = [a for a in self._pending if now - a.created >= 2]
+                self._pending = [a for a in self._pending if now - a.created < 2]
+            for alert in ready:
+                self._emit(alert)
+
+    def _emit(self, alert: _PendingAlert):
+        try:
+            self._on_alert(alert.name, alert.line, alert.before, alert.after, alert.repeats)
+        except Exception as e:
+            logger.error(f"Ошибка отправки алерта по логу {self.name}: {e}")
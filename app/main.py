@@ -12,15 +12,103 @@ import json
 import logging
 import threading
 import os
-from typing import Optional, Dict, Any
+import secrets
+import signal
+from typing import Optional, Dict, Any, Iterator, List, Tuple
 from datetime import datetime
+from urllib.parse import urlparse
+
+from . import metrics
+from .cgroup import CgroupStats
+from .collector import StatusCollector, disk_usage, format_bytes, memory_usage
+from .dispatcher import Dispatcher
+from .docker_api import DockerClient, DockerError, DockerTimeout
+from .history import History, sparkline
+from .logwatch import LogWatcher
+from .peers import PeerTracker, format_rate
+from .sender import OutboundQueue
+from .speedtest import SpeedTest
+from .state import StateStore
+from .subscribers import ALERT_TYPES, SubscriberRegistry, load_subscribers
+from .targets import ProbeScheduler, Target, load_targets
+from .webhook import WebhookServer
+from .wg_api import WGEasyAPI, WGEasyAPIError
 
 # Настройки из переменных окружения
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 ADMIN_ID = int(os.getenv("ADMIN_ID", "0"))
-BASE_URL = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}"
+# Адрес Bot API: свой сервер telegram-bot-api или заглушка бенчмарка
+TELEGRAM_API_URL = (os.getenv("TELEGRAM_API_URL") or "https://api.telegram.org").rstrip("/")
+BASE_URL = f"{TELEGRAM_API_URL}/bot{TELEGRAM_TOKEN}"
 WG_EASY_URL = os.getenv("WG_EASY_URL", "http://localhost:51821")
 MONITOR_INTERVAL = int(os.getenv("MONITOR_INTERVAL", "10"))
+WG_EASY_CONTAINER = os.getenv("WG_EASY_CONTAINER", "wg-easy")
+# auto — события Docker при доступном сокете, иначе опрос; events; poll
+MONITOR_MODE = os.getenv("MONITOR_MODE", "auto")
+# Интервал страховочного опроса в режиме событий
+MONITOR_SAFETY_INTERVAL = int(os.getenv("MONITOR_SAFETY_INTERVAL", "60"))
+# Пул для долгих команд (скорость, перезагрузка, статус)
+COMMAND_WORKERS = int(os.getenv("COMMAND_WORKERS", "2"))
+# Период фонового обновления данных для /status
+STATUS_REFRESH_INTERVAL = int(os.getenv("STATUS_REFRESH_INTERVAL", "30"))
+# Способ получения обновлений: polling (по умолчанию) или webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+POLL_TIMEOUT = int(os.getenv("POLL_TIMEOUT", "30"))
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+# Очередь исходящих сообщений
+SEND_QUEUE_LIMIT = int(os.getenv("SEND_QUEUE_LIMIT", "100"))
+# Окно, в котором повторные алерты склеиваются в одну сводку
+ALERT_COALESCE_WINDOW = float(os.getenv("ALERT_COALESCE_WINDOW", "10"))
+# Потоки доставки: медленный чат не задерживает остальных получателей
+SEND_WORKERS = int(os.getenv("SEND_WORKERS", "4"))
+# JSON-файл с дополнительными подписчиками (роли и типы алертов); ADMIN_ID — всегда admin
+SUBSCRIBERS_FILE = os.getenv("SUBSCRIBERS_FILE", "")
+# JSON-файл с целями мониторинга; без него — одна цель из WG_EASY_CONTAINER/WG_EASY_URL
+TARGETS_FILE = os.getenv("TARGETS_FILE", "")
+PROBE_WORKERS = int(os.getenv("PROBE_WORKERS", "4"))
+# Адаптивный интервал: быстрые перепроверки после сбоя и потолок для стабильной цели (секунды)
+PROBE_FAST_INTERVAL = float(os.getenv("PROBE_FAST_INTERVAL", "2"))
+PROBE_MAX_INTERVAL = float(os.getenv("PROBE_MAX_INTERVAL", "60"))
+# Алерт и восстановление — после HEALTH_THRESHOLD из HEALTH_WINDOW последних проверок
+HEALTH_THRESHOLD = int(os.getenv("HEALTH_THRESHOLD", "2"))
+HEALTH_WINDOW = int(os.getenv("HEALTH_WINDOW", "3"))
+# Пир считается неактивным, если рукопожатия не было дольше (секунды)
+PEER_STALE_SECONDS = int(os.getenv("PEER_STALE_SECONDS", "180"))
+PEERS_PAGE_SIZE = 20
+# Пароль веб-интерфейса wg-easy для управления клиентами через API
+WG_EASY_PASSWORD = os.getenv("WG_EASY_PASSWORD", "")
+CLIENTS_PAGE_SIZE = 10
+# Экспорт метрик Prometheus на /metrics (0 — выключен)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_LISTEN = os.getenv("METRICS_LISTEN", "0.0.0.0")
+# Встроенный тест скорости: эндпоинты, число потоков, длительность фазы и общий бюджет (секунды)
+SPEEDTEST_DOWNLOAD_URL = os.getenv("SPEEDTEST_DOWNLOAD_URL", "https://speed.cloudflare.com/__down?bytes=50000000")
+SPEEDTEST_UPLOAD_URL = os.getenv("SPEEDTEST_UPLOAD_URL", "https://speed.cloudflare.com/__up")
+SPEEDTEST_LATENCY_URL = os.getenv("SPEEDTEST_LATENCY_URL", "https://speed.cloudflare.com/__down?bytes=0")
+SPEEDTEST_STREAMS = int(os.getenv("SPEEDTEST_STREAMS", "4"))
+SPEEDTEST_DURATION = float(os.getenv("SPEEDTEST_DURATION", "8"))
+SPEEDTEST_BUDGET = float(os.getenv("SPEEDTEST_BUDGET", "25"))
+SPEEDTEST_CACHE_TTL = float(os.getenv("SPEEDTEST_CACHE_TTL", "60"))
+# Наблюдение за логами контейнеров: шаблоны (JSON {"имя": "regex"}), буфер для /logs,
+# строки контекста в алерте, подавление повторов (секунды) и общий лимит алертов
+LOG_WATCH = os.getenv("LOG_WATCH", "true").lower() == "true"
+LOG_PATTERNS = json.loads(os.getenv("LOG_PATTERNS", "") or "null")
+LOG_BUFFER_LINES = int(os.getenv("LOG_BUFFER_LINES", "500"))
+LOG_CONTEXT_LINES = int(os.getenv("LOG_CONTEXT_LINES", "3"))
+LOG_ALERT_COOLDOWN = float(os.getenv("LOG_ALERT_COOLDOWN", "300"))
+LOG_ALERTS_PER_MINUTE = float(os.getenv("LOG_ALERTS_PER_MINUTE", "6"))
+LOGS_DEFAULT_LINES = 30
+# Ресурсы контейнера из cgroup v2: корни файловых систем и пороги алертов (проценты)
+CGROUP_ROOT = os.getenv("CGROUP_ROOT", "/sys/fs/cgroup")
+PROC_ROOT = os.getenv("PROC_ROOT", "/proc")
+CONTAINER_CPU_ALERT = float(os.getenv("CONTAINER_CPU_ALERT", "90"))
+CONTAINER_MEMORY_ALERT = float(os.getenv("CONTAINER_MEMORY_ALERT", "90"))
+# Файл состояния (offset, мониторинг, здоровье целей); пусто — не сохранять
+STATE_FILE = os.getenv("STATE_FILE", "data/state.json")
+STATE_FLUSH_INTERVAL = float(os.getenv("STATE_FLUSH_INTERVAL", "5"))
 
 # Настройка логирования (только ошибки)
 logging.basicConfig(
@@ -44,275 +132,899 @@ class WGEasyBot:
     def __init__(self):
         self.session = requests.Session()
         self.session.timeout = 3  # Очень короткий таймаут
-        self.monitoring_enabled = True
-        self.last_status = None
-        self.monitor_thread = None
+        # Состояние с прошлого запуска: мониторинг, здоровье целей, offset обновлений
+        self.state = StateStore(STATE_FILE, STATE_FLUSH_INTERVAL)
+        self.monitoring_enabled = self.state.get("monitoring_enabled", True)
         self.stop_monitoring = False
+        # Docker Engine API через сокет; при недоступности используем docker CLI
+        self.docker = DockerClient.from_env()
+        self.events_thread = None
+        self._status_lock = threading.Lock()
+        # Цели мониторинга; первая — основная (для /status, /restart и т.п.)
+        default_target = Target(WG_EASY_CONTAINER, container=WG_EASY_CONTAINER, url=WG_EASY_URL,
+                                interval=MONITOR_INTERVAL, timeout=2,
+                                fast_interval=PROBE_FAST_INTERVAL, max_interval=PROBE_MAX_INTERVAL,
+                                threshold=HEALTH_THRESHOLD, window=HEALTH_WINDOW)
+        self.targets = load_targets(TARGETS_FILE, default_target)
+        self._restore_health()
+        self.primary = self.targets[0]
+        self.scheduler = ProbeScheduler(self.targets, self.check_target, self._on_probe_result, PROBE_WORKERS)
+        self.history = History([target.name for target in self.targets])
+        self.peers = PeerTracker(PEER_STALE_SECONDS)
+        # CPU/память/сеть основного контейнера и состояние алертов по порогам
+        self.container_stats = CgroupStats(self._container_identity, CGROUP_ROOT, PROC_ROOT) \
+            if self.primary.container else None
+        self._resource_alerts = {"cpu": False, "memory": False}
+        # API wg-easy основной цели (клиенты, конфиги, QR-коды)
+        self.wg_api = WGEasyAPI(self.primary.url, WG_EASY_PASSWORD) if self.primary.url else None
+        self.speedtest = SpeedTest(SPEEDTEST_DOWNLOAD_URL, SPEEDTEST_UPLOAD_URL, SPEEDTEST_LATENCY_URL,
+                                   streams=SPEEDTEST_STREAMS, duration=SPEEDTEST_DURATION,
+                                   budget=SPEEDTEST_BUDGET, cache_ttl=SPEEDTEST_CACHE_TTL)
+        self.dispatcher = Dispatcher(max_workers=COMMAND_WORKERS)
+        # Лог каждого контейнера-цели читается потоком в кольцевой буфер
+        self.log_watchers: Dict[str, LogWatcher] = {}
+        if LOG_WATCH:
+            for target in self.targets:
+                if target.container:
+                    self.log_watchers[target.name] = LogWatcher(
+                        target.container,
+                        lambda since, tail, follow, container=target.container:
+                            self._container_logs(container, since, tail, follow),
+                        lambda *alert, target=target: self._on_log_alert(target, *alert),
+                        patterns=LOG_PATTERNS, buffer_lines=LOG_BUFFER_LINES,
+                        context=LOG_CONTEXT_LINES, cooldown=LOG_ALERT_COOLDOWN,
+                        rate_per_minute=LOG_ALERTS_PER_MINUTE,
+                    )
+        self.collector = StatusCollector(self.collect_status, STATUS_REFRESH_INTERVAL)
+        self.outbox = OutboundQueue(self.session, BASE_URL, maxsize=SEND_QUEUE_LIMIT,
+                                    coalesce_window=ALERT_COALESCE_WINDOW, workers=SEND_WORKERS)
+        # Получатели алертов: роли, подписки (сохраняются между перезапусками), итоги доставки
+        self.subscribers = SubscriberRegistry(load_subscribers(SUBSCRIBERS_FILE, ADMIN_ID))
+        self.subscribers.restore(self.state.get("subscriptions", {}))
         
     def send_message(self, chat_id: int, text: str, reply_markup: Optional[Dict] = None) -> bool:
-        """Отправить сообщение в Telegram"""
-        try:
-            data = {
-                "chat_id": chat_id,
-                "text": text,
-                "parse_mode": "Markdown"
-            }
-            if reply_markup:
-                data["reply_markup"] = json.dumps(reply_markup)
-            else:
-                data["reply_markup"] = json.dumps(PERSISTENT_KEYBOARD)
-            
-            response = self.session.post(f"{BASE_URL}/sendMessage", data=data, timeout=5)
-            response.raise_for_status()
-            return True
-        except Exception as e:
-            logger.error(f"Ошибка отправки сообщения: {e}")
-            return False
+        """Поставить сообщение в очередь отправки Telegram"""
+        markup = json.dumps(reply_markup or PERSISTENT_KEYBOARD)
+        return self.outbox.put(chat_id, text, markup)
+    
+    def edit_message(self, chat_id: int, message_id: int, text: str, reply_markup: Optional[Dict] = None) -> bool:
+        """Поставить в очередь правку отправленного сообщения"""
+        markup = json.dumps(reply_markup) if reply_markup else None
+        return self.outbox.put(chat_id, text, markup, message_id=message_id)
+    
+    def send_document(self, chat_id: int, filename: str, content: bytes, caption: str = "") -> bool:
+        """Поставить в очередь отправку файла"""
+        return self.outbox.put_document(chat_id, filename, content, caption)
+    
+    def send_alert(self, chat_id: int, text: str, on_result=None, keyboard: bool = True) -> bool:
+        """Отправить алерт; частые алерты склеиваются в сводку"""
+        markup = json.dumps(PERSISTENT_KEYBOARD) if keyboard else None
+        return self.outbox.put_alert(chat_id, text, markup, on_result)
+    
+    def broadcast_alert(self, alert_type: str, text: str) -> int:
+        """Разослать алерт всем подписанным на его тип; не ждет доставки"""
+        recipients = self.subscribers.recipients(alert_type)
+        for subscriber in recipients:
+            chat_id = subscriber.chat_id
+            self.send_alert(
+                chat_id, text,
+                lambda ok, detail, chat_id=chat_id: self.subscribers.record(chat_id, ok, detail),
+                # Кнопки управления — только тем, кто может ими пользоваться
+                keyboard=subscriber.role != "viewer",
+            )
+        return len(recipients)
+    
+    def get_alert_settings(self, chat_id: int) -> tuple[str, Dict[str, Any]]:
+        """Подписки чата на типы алертов с кнопками переключения"""
+        subscriber = self.subscribers.get(chat_id)
+        keyboard = [[{"text": f"{'✅' if alert_type in subscriber.alerts else '⚪'} {label}",
+                      "callback_data": f"alerts:{alert_type}"}]
+                    for alert_type, label in ALERT_TYPES.items()]
+        return (f"🔔 *Алерты для этого чата* (роль: {subscriber.role})\n\nНажмите, чтобы переключить.",
+                {"inline_keyboard": keyboard})
+    
+    def toggle_alert(self, chat_id: int, alert_type: str):
+        if alert_type in ALERT_TYPES:
+            self.subscribers.toggle(chat_id, alert_type)
+            self.state.set("subscriptions", self.subscribers.subscriptions())
+    
+    def get_subscribers(self) -> str:
+        """Подписчики, их подписки и итоги доставки алертов"""
+        lines = ["👥 *Подписчики*", ""]
+        for subscriber in self.subscribers.all():
+            alerts = ", ".join(sorted(subscriber.alerts)) or "нет"
+            line = (f"• *{md_escape(subscriber.name)}* (`{subscriber.chat_id}`, {subscriber.role}): {alerts}\n"
+                    f"   доставлено {subscriber.delivered}, ошибок {subscriber.failed}")
+            if subscriber.last_result is not None:
+                at, ok, detail = subscriber.last_result
+                result = "✅" if ok else f"❌ {md_escape(detail)}"
+                line += f", последний {format_age(time.time() - at)}: {result}"
+            lines.append(line)
+        return "\n".join(lines)
+    
+    @property
+    def last_status(self) -> Optional[bool]:
+        """Последний известный статус основной цели"""
+        return self.primary.last_ok
     
     def check_wg_easy_status(self) -> tuple[bool, str]:
-        """Проверить статус wg-easy сервера (только контейнер)"""
+        """Проверить статус основного wg-easy сервера (только контейнер)"""
+        return self.check_target(self.primary)
+    
+    def check_target(self, target: Target) -> tuple[bool, str]:
+        """Проверить цель: контейнер и/или веб-интерфейс"""
         try:
-            # Проверяем только статус контейнера (быстро и надежно)
-            result = subprocess.run(
-                ["docker", "ps", "--filter", "name=wg-easy", "--format", "{{.Status}}"], 
-                capture_output=True, text=True, timeout=2
-            )
-            container_status = result.stdout.strip()
-            
-            if not container_status or "up" not in container_status.lower():
-                return False, "Контейнер не запущен"
-            
-            # Дополнительная проверка - есть ли процесс wg-easy
-            result2 = subprocess.run(
-                ["docker", "exec", "wg-easy", "ps", "aux"], 
-                capture_output=True, text=True, timeout=2
-            )
+            if target.container:
+                # Проверяем статус контейнера (быстро и надежно)
+                with metrics.PROBE_SECONDS.time("container_status"):
+                    container_status = self._container_status(timeout=target.timeout, container=target.container)
+                
+                if not container_status or "up" not in container_status.lower():
+                    metrics.PROBE_FAILURES.inc("container_status")
+                    return False, "Контейнер не запущен"
+                
+                # Дополнительная проверка - есть ли процесс wg-easy
+                with metrics.PROBE_SECONDS.time("container_exec"):
+                    exit_code = self._container_exec(["ps", "aux"], timeout=target.timeout, container=target.container)
+                if exit_code != 0:
+                    metrics.PROBE_FAILURES.inc("container_exec")
+                    return False, "Контейнер не отвечает"
             
-            if result2.returncode != 0:
-                return False, "Контейнер не отвечает"
+            if target.check_url and not self._check_web(target.url, target.timeout):
+                return False, "Веб-интерфейс недоступен"
             
             return True, "Сервер работает нормально"
             
         except Exception as e:
-            logger.error(f"Ошибка проверки статуса: {e}")
+            logger.error(f"Ошибка проверки статуса {target.name}: {e}")
+            metrics.PROBE_FAILURES.inc("error")
             return False, f"Ошибка проверки: {str(e)}"
     
-    def get_server_status(self) -> str:
-        """Получить подробный статус сервера"""
+    def _check_web(self, url: str, timeout: float) -> bool:
+        """Доступен ли веб-интерфейс (через пул соединений сессии)"""
         try:
-            # Проверяем статус контейнера
-            result = subprocess.run(
-                ["docker", "ps", "--filter", "name=wg-easy", "--format", "{{.Status}}"], 
-                capture_output=True, text=True, timeout=3
-            )
-            container_status = result.stdout.strip() or "Не запущен"
-            
-            # Проверяем доступность веб-интерфейса (с таймаутом)
-            web_status = "❌ Недоступен"
-            try:
-                response = requests.get(f"{WG_EASY_URL}/", timeout=2)
-                if response.status_code == 200:
-                    web_status = "✅ Доступен"
-            except:
-                pass
-            
+            with metrics.PROBE_SECONDS.time("web"):
+                response = self.session.get(f"{url.rstrip('/')}/", timeout=timeout)
+            if response.status_code == 200:
+                return True
+        except requests.RequestException:
+            pass
+        metrics.PROBE_FAILURES.inc("web")
+        return False
+    
+    def collect_status(self) -> Dict[str, Any]:
+        """Собрать данные для /status (вызывается фоновым сборщиком)"""
+        # Проверяем статус контейнера
+        container_status = "—"
+        if self.primary.container:
+            container_status = self._container_status(timeout=3, container=self.primary.container) or "Не запущен"
+        
+        # Проверяем доступность веб-интерфейса (с таймаутом)
+        web_status = "—"
+        if self.primary.url:
+            web_status = "✅ Доступен" if self._check_web(self.primary.url, 2) else "❌ Недоступен"
+        
+        self._record_host_usage()
+        peers = self._collect_peers()
+        return {
+            "peers": peers,
+            "container": container_status,
+            "web": web_status,
+            "resources": self._collect_container_stats(),
             # Проверяем использование ресурсов
-            memory_usage = self._get_memory_usage()
-            disk_usage = self._get_disk_usage()
+            "memory": self._get_memory_usage(),
+            "disk": self._get_disk_usage(),
+        }
+    
+    def _collect_container_stats(self) -> str:
+        """Замер cgroup основного контейнера, проверка порогов и строка для /status"""
+        if self.container_stats is None:
+            return "—"
+        stats = self.container_stats.sample()
+        if stats is None:
+            return "N/A"
+        limit = stats["memory_limit"]
+        if limit is None:
+            host = memory_usage()
+            limit = host[1] if host else None
+        memory_percent = stats["memory"] / limit * 100 if limit else None
+        self._check_resource_threshold("cpu", stats["cpu_percent"], CONTAINER_CPU_ALERT, "CPU")
+        self._check_resource_threshold("memory", memory_percent, CONTAINER_MEMORY_ALERT, "Память")
+        
+        cpu = f"{stats['cpu_percent']:.1f}%" if stats["cpu_percent"] is not None else "—"
+        memory = format_bytes(stats["memory"])
+        if stats["memory_limit"] is not None:
+            memory += f"/{format_bytes(stats['memory_limit'])}"
+        text = f"CPU {cpu}, RAM {memory}"
+        if stats["rx_rate"] is not None:
+            text += f", сеть ⬇️ {format_rate(stats['rx_rate'])} ⬆️ {format_rate(stats['tx_rate'])}"
+        return text
+    
+    def _check_resource_threshold(self, key: str, value: Optional[float], threshold: float, label: str):
+        """Алерт при превышении порога и сообщение, когда значение вернулось в норму"""
+        if value is None or not threshold:
+            return
+        # Возврат в норму — ниже 90% порога, чтобы не дергаться около границы
+        active = self._resource_alerts[key]
+        exceeded = value >= (threshold * 0.9 if active else threshold)
+        if exceeded == active:
+            return
+        self._resource_alerts[key] = exceeded
+        if not self.monitoring_enabled:
+            return
+        container = md_escape(self.primary.container)
+        if exceeded:
+            self.broadcast_alert("resources", f"🔥 *{label} контейнера {container}*: {value:.0f}% (порог {threshold:g}%)")
+        else:
+            self.broadcast_alert("resources", f"✅ *{label} контейнера {container}*: снова {value:.0f}%")
+    
+    def _collect_peers(self) -> str:
+        """Снять `wg show all dump` и обновить статистику пиров"""
+        if not self.primary.container:
+            return "—"
+        try:
+            with metrics.PROBE_SECONDS.time("wg_dump"):
+                exit_code, output = self._container_run(["wg", "show", "all", "dump"], timeout=5,
+                                                        container=self.primary.container)
+        except Exception as e:
+            logger.error(f"Ошибка получения статистики WireGuard: {e}")
+            metrics.PROBE_FAILURES.inc("wg_dump")
+            return "N/A"
+        if exit_code != 0:
+            metrics.PROBE_FAILURES.inc("wg_dump")
+            return "N/A"
+        self.peers.update(output)
+        total, active = self.peers.summary()
+        return f"{total} (активных {active})"
+    
+    def _record_host_usage(self):
+        """Сохранить загрузку памяти и диска в историю"""
+        try:
+            memory_used, memory_total = memory_usage()
+            disk_used, disk_total = disk_usage("/")
+            self.history.record_host(memory_used / memory_total * 100, disk_used / disk_total * 100)
+        except (OSError, TypeError, ZeroDivisionError):
+            pass
+    
+    def get_server_status(self, refresh: bool = False) -> str:
+        """Получить статус сервера из кэша фонового сборщика"""
+        try:
+            snapshot = self.collector.snapshot()
+            if refresh or snapshot is None:
+                snapshot = self.collector.refresh()
             
             # Проверяем мониторинг
             monitor_status = "✅ Активен" if self.monitoring_enabled else "❌ Отключен"
+            updated = format_age(time.time() - snapshot["collected_at"])
+            
+            if len(self.targets) > 1:
+                return f"""🖥️ *Статус серверов wg-easy*
+
+{self._targets_summary()}
+
+🧮 *Ресурсы {md_escape(self.primary.name)}*: {snapshot["resources"]}
+📊 *Память*: {snapshot["memory"]}
+💾 *Диск*: {snapshot["disk"]}
+🔔 *Мониторинг*: {monitor_status}
+{self._probe_stats()}
+🕒 *Обновлено*: {updated}"""
             
             return f"""🖥️ *Статус сервера wg-easy*
 
-🐳 *Контейнер*: {container_status}
-🌐 *Веб-интерфейс*: {web_status}
-📊 *Память*: {memory_usage}
-💾 *Диск*: {disk_usage}
+🐳 *Контейнер*: {snapshot["container"]}
+🧮 *Ресурсы контейнера*: {snapshot["resources"]}
+🌐 *Веб-интерфейс*: {snapshot["web"]}
+👥 *Пиры*: {snapshot["peers"]}
+📊 *Память*: {snapshot["memory"]}
+💾 *Диск*: {snapshot["disk"]}
 🔔 *Мониторинг*: {monitor_status}
-🔗 *URL*: {WG_EASY_URL}"""
+{self._probe_stats()}
+🔗 *URL*: {self.primary.url or "—"}
+🕒 *Обновлено*: {updated}"""
             
         except Exception as e:
             logger.error(f"Ошибка получения статуса: {e}")
             return f"❌ Ошибка получения статуса: {str(e)}"
     
+    def _probe_stats(self) -> str:
+        """Число проверок, текущий интервал и время обнаружения сбоев"""
+        probes = sum(target.probes for target in self.targets)
+        if len(self.targets) > 1:
+            interval = f"{min(t.current_interval for t in self.targets):.0f}–{max(t.current_interval for t in self.targets):.0f}"
+        else:
+            interval = f"{self.primary.current_interval:.0f}"
+        lines = [f"🩺 *Проверки*: {probes}, интервал сейчас {interval} с"]
+        detections = sum(target.detections for target in self.targets)
+        if detections:
+            average = sum(target.detection_total for target in self.targets) / detections
+            lines.append(f"⏱ *Обнаружение сбоя*: в среднем {average:.0f} с (сбоев: {detections})")
+        return "\n".join(lines)
+    
+    def _targets_summary(self) -> str:
+        """По строке на цель: результат последней проверки"""
+        lines = []
+        for target in self.targets:
+            icon = {True: "✅", False: "❌", None: "⏳"}[target.last_ok]
+            details = target.last_message or "ожидает проверки"
+            if target.last_checked is not None:
+                details += f", {format_age(time.time() - target.last_checked)}"
+            lines.append(f"{icon} *{md_escape(target.name)}*: {details}")
+        return "\n".join(lines)
+    
+    def get_target_detail(self, name: str) -> str:
+        """Подробный статус одной цели (собирается заново)"""
+        target = self.scheduler.targets.get(name)
+        if target is None:
+            return "❌ Цель не найдена"
+        lines = [f"🎯 *{md_escape(target.name)}*", ""]
+        if target.container:
+            container_status = self._container_status(timeout=target.timeout, container=target.container)
+            lines.append(f"🐳 *Контейнер*: {md_escape(target.container)} — {container_status or 'Не запущен'}")
+        if target.url:
+            web_status = "✅ Доступен" if self._check_web(target.url, target.timeout) else "❌ Недоступен"
+            lines.append(f"🌐 *Веб-интерфейс*: {web_status}")
+            lines.append(f"🔗 *URL*: {target.url}")
+        if target.last_checked is not None:
+            latency = round((target.last_latency or 0) * 1000)
+            lines.append(f"🩺 *Последняя проверка*: {target.last_message} "
+                         f"({format_age(time.time() - target.last_checked)}, {latency} мс)")
+        lines.append(f"⏱ *Интервал*: {target.current_interval:.0f} с (базовый {target.interval:g} с, "
+                     f"до {max(target.max_interval, target.interval):g} с), таймаут {target.timeout:g} с")
+        lines.append(f"🩺 *Проверок*: {target.probes}, подтверждение {target.health.threshold} из {target.health.window}")
+        if target.last_detection is not None:
+            lines.append(f"🚨 *Обнаружение сбоя*: {target.last_detection:.0f} с (в среднем "
+                         f"{target.detection_total / target.detections:.0f} с)")
+        return "\n".join(lines)
+    
     def get_speed_test(self) -> str:
-        """Проверить реальную скорость интернета (download/upload/ping)"""
+        """Проверить реальную скорость интернета (ping/download/upload)"""
         try:
-            # Основной путь: speedtest-cli JSON
-            result = subprocess.run(
-                ["speedtest-cli", "--json"],
-                capture_output=True, text=True, timeout=90
-            )
-            if result.returncode != 0 or not result.stdout.strip():
-                # Фоллбек: текстовый вывод
-                txt = subprocess.run(["speedtest-cli"], capture_output=True, text=True, timeout=90)
-                if txt.returncode == 0 and txt.stdout:
-                    out = txt.stdout
-                    import re
-                    ping_match = re.search(r"Ping:\s*([0-9.]+) ms", out)
-                    down_match = re.search(r"Download:\s*([0-9.]+) Mbit/s", out)
-                    up_match = re.search(r"Upload:\s*([0-9.]+) Mbit/s", out)
-                    ping_ms = ping_match.group(1) if ping_match else "N/A"
-                    download_mbps = down_match.group(1) if down_match else "N/A"
-                    upload_mbps = up_match.group(1) if up_match else "N/A"
-                    return f"""🚀 *Тест скорости*
-
-📡 *Сервер*: {WG_EASY_URL}
-🏓 *Ping*: {ping_ms} ms
-⬇️ *Download*: {download_mbps} Mbit/s
-⬆️ *Upload*: {upload_mbps} Mbit/s"""
-                # Второй фоллбек: измерение download по прямой закачке
-                try:
-                    import time as _t
-                    test_url = "https://speed.hetzner.de/100MB.bin"
-                    t0 = _t.time()
-                    r = self.session.get(test_url, stream=True, timeout=60)
-                    total = 0
-                    for chunk in r.iter_content(chunk_size=1024 * 256):
-                        if not chunk:
-                            break
-                        total += len(chunk)
-                        if _t.time() - t0 > 8:
-                            break
-                    dt = _t.time() - t0
-                    mbps = round((total * 8) / 1_000_000 / max(dt, 0.001), 2)
-                    return f"""🚀 *Тест скорости (simple)*
-
-📡 *Сервер*: {WG_EASY_URL}
-⬇️ *Download (оценка)*: {mbps} Mbit/s (≈{int(total/1_000_000)} MB за {round(dt,1)}s)"""
-                except Exception as fe:
-                    return f"❌ Ошибка speedtest: {result.stderr.strip() or txt.stderr.strip() or str(fe)}"
-            data = json.loads(result.stdout)
-            ping_ms = round(float(data.get("ping", 0))) if "ping" in data else "N/A"
-            download_mbps = round(float(data.get("download", 0)) / 1_000_000, 2) if "download" in data else "N/A"
-            upload_mbps = round(float(data.get("upload", 0)) / 1_000_000, 2) if "upload" in data else "N/A"
-            return f"""🚀 *Тест скорости*
-
-📡 *Сервер*: {WG_EASY_URL}
-🏓 *Ping*: {ping_ms} ms
-⬇️ *Download*: {download_mbps} Mbit/s
-⬆️ *Upload*: {upload_mbps} Mbit/s"""
+            result = self.speedtest.run()
         except Exception as e:
             return f"❌ Ошибка: {str(e)}"
+        
+        def mbps(value):
+            return f"{value:.1f} Mbit/s" if value is not None else "N/A"
+        
+        if result["ping_ms"] is not None:
+            ping = (f"{result['ping_ms']:.0f} ms (p90 {result['ping_p90_ms']:.0f} ms, "
+                    f"джиттер {result['jitter_ms']:.1f} ms)")
+        else:
+            ping = "N/A"
+        lines = [
+            "🚀 *Тест скорости*",
+            "",
+            f"📡 *Сервер*: {md_escape(urlparse(SPEEDTEST_DOWNLOAD_URL).netloc)}",
+            f"🏓 *Ping*: {ping}",
+            f"⬇️ *Download*: {mbps(result['download_mbps'])}",
+            f"⬆️ *Upload*: {mbps(result['upload_mbps'])}",
+            f"🧵 Потоков: {SPEEDTEST_STREAMS}, длительность {result['duration']:.0f} с",
+        ]
+        if result["age"] > 0:
+            lines.append(f"🕒 Из кэша, замер {format_age(result['age'])}")
+        if result["errors"]:
+            lines.append(f"⚠️ {md_escape(result['errors'][0])}")
+        return "\n".join(lines)
     
     def restart_container(self) -> str:
         """Перезапустить контейнер"""
+        container = self.primary.container
+        if not container:
+            return f"❌ У цели *{md_escape(self.primary.name)}* нет контейнера, перезапуск недоступен"
         try:
-            logger.error("Перезапуск контейнера wg-easy")
-            result = subprocess.run(["docker", "restart", "wg-easy"], capture_output=True, text=True, timeout=60)
-            if result.returncode != 0:
-                return f"❌ Ошибка перезапуска: {result.stderr.strip() or result.stdout.strip() or 'неизвестная ошибка'}"
+            logger.error(f"Перезапуск контейнера {container}")
+            error = self._container_restart(timeout=60, container=container)
+            if error is not None:
+                return f"❌ Ошибка перезапуска: {error or 'неизвестная ошибка'}"
             time.sleep(2)
-            status = subprocess.run(
-                ["docker", "ps", "--filter", "name=wg-easy", "--format", "{{.Status}}"],
-                capture_output=True, text=True, timeout=5
-            )
-            status_text = status.stdout.strip() or "Статус неизвестен"
+            status_text = self._container_status(timeout=5, container=container) or "Статус неизвестен"
             return f"✅ *Контейнер перезапущен!*\n\nСтатус: {status_text}"
         except Exception as e:
             logger.error(f"Ошибка перезапуска: {e}")
             return f"❌ Ошибка перезапуска: {str(e)}"
     
+    def get_history(self, name: Optional[str] = None) -> str:
+        """Аптайм, задержка, инциденты и ресурсы хоста за 1ч/24ч/7д"""
+        target = self.scheduler.targets.get(name) if name else self.primary
+        if target is None:
+            return "❌ Цель не найдена"
+        
+        lines = [f"📈 *История: {md_escape(target.name)}*", ""]
+        for window in self.history.target_windows(target.name):
+            if window["uptime"] is None:
+                lines.append(f"⏱ *{window['label']}*: нет данных")
+                continue
+            latency_ms = [v * 1000 if v is not None else None for v in window["latency"]]
+            lines.append(f"⏱ *{window['label']}*: аптайм {window['uptime']:.2f}%, "
+                         f"задержка ср. {window['latency_avg'] * 1000:.0f} мс")
+            lines.append(f"`{sparkline(window['availability'], 0, 1)}` доступность")
+            lines.append(f"`{sparkline(latency_ms, 0)}` задержка")
+        
+        host = self.history.host_window()
+        if any(v is not None for v in host["memory"]):
+            lines += ["", "🖥️ *Хост за 24 ч*:",
+                      f"`{sparkline(host['memory'], 0, 100)}` память",
+                      f"`{sparkline(host['disk'], 0, 100)}` диск"]
+        
+        incidents = self.history.incidents(target.name)
+        lines += ["", "🚨 *Инциденты*:" if incidents else "✅ Инцидентов не было"]
+        for started, ended, reason in reversed(incidents[-5:]):
+            start_text = datetime.fromtimestamp(started).strftime("%d.%m %H:%M")
+            if ended is None:
+                lines.append(f"• {start_text} — продолжается: {reason}")
+            else:
+                duration = max(1, round((ended - started) / 60))
+                end_text = datetime.fromtimestamp(ended).strftime("%H:%M")
+                lines.append(f"• {start_text}–{end_text} ({duration} мин): {reason}")
+        return "\n".join(lines)
+    
+    def _peer_line(self, peer, now: float) -> str:
+        icon = "🔴" if self.peers.is_stale(peer, now) else "🟢"
+        handshake = "нет" if peer.handshake == 0 else format_age(now - peer.handshake)
+        return (f"{icon} `{peer.address}` {peer.public_key[:8]}… "
+                f"↓{format_rate(peer.rx_rate)} ↑{format_rate(peer.tx_rate)} · {handshake}")
+    
+    def get_peers_page(self, page: int = 0) -> tuple[str, Optional[Dict[str, Any]]]:
+        """Страница списка пиров и клавиатура навигации"""
+        peers = self.peers.snapshot()
+        if self.peers.updated_at is None:
+            return "⏳ Статистика WireGuard еще не собрана", None
+        pages = max(1, -(-len(peers) // PEERS_PAGE_SIZE))
+        page = min(max(page, 0), pages - 1)
+        now = time.time()
+        total, active = self.peers.summary()
+        lines = [f"👥 *Пиры WireGuard*: {total}, активных {active} (стр. {page + 1}/{pages})", ""]
+        start = page * PEERS_PAGE_SIZE
+        lines += [self._peer_line(peer, now) for peer in peers[start:start + PEERS_PAGE_SIZE]]
+        if not peers:
+            lines.append("Пиров нет")
+        lines.append(f"\n🕒 *Обновлено*: {format_age(now - self.peers.updated_at)}")
+        
+        navigation = []
+        if page > 0:
+            navigation.append({"text": "◀️", "callback_data": f"peers:{page - 1}"})
+        navigation.append({"text": "🔄", "callback_data": f"peers:{page}"})
+        if page < pages - 1:
+            navigation.append({"text": "▶️", "callback_data": f"peers:{page + 1}"})
+        return "\n".join(lines), {"inline_keyboard": [navigation]}
+    
+    def get_top_peers(self, count: int = 10) -> str:
+        """Самые активные пиры по текущей скорости"""
+        if self.peers.updated_at is None:
+            return "⏳ Статистика WireGuard еще не собрана"
+        top = [peer for peer in self.peers.top(count) if peer.total_rate > 0]
+        if not top:
+            return "📶 Сейчас нет активного трафика (скорости считаются со второго цикла сбора)"
+        now = time.time()
+        lines = ["📶 *Топ пиров по трафику*", ""]
+        lines += [f"{i}. {self._peer_line(peer, now)}" for i, peer in enumerate(top, 1)]
+        return "\n".join(lines)
+    
+    def get_clients_page(self, page: int = 0, force: bool = False) -> tuple[str, Optional[Dict[str, Any]]]:
+        """Страница списка клиентов wg-easy с кнопками"""
+        if not self.wg_api:
+            return "❌ WG_EASY_URL не задан, управление клиентами недоступно", None
+        try:
+            clients = self.wg_api.list_clients(force=force)
+        except WGEasyAPIError as e:
+            return f"❌ Ошибка API wg-easy: {str(e)}", None
+        
+        pages = max(1, -(-len(clients) // CLIENTS_PAGE_SIZE))
+        page = min(max(page, 0), pages - 1)
+        disabled = sum(1 for client in clients if not client.get("enabled", True))
+        text = f"🔑 *Клиенты wg-easy*: {len(clients)}, отключено {disabled} (стр. {page + 1}/{pages})"
+        if not clients:
+            text += "\n\nКлиентов нет. Создать: `/newclient имя`"
+        
+        start = page * CLIENTS_PAGE_SIZE
+        buttons = [{"text": f"{'🟢' if client.get('enabled', True) else '⚪'} {client.get('name', '?')}",
+                    "callback_data": f"wgc:show:{client['id']}"}
+                   for client in clients[start:start + CLIENTS_PAGE_SIZE]]
+        keyboard = [buttons[i:i + 2] for i in range(0, len(buttons), 2)]
+        navigation = []
+        if page > 0:
+            navigation.append({"text": "◀️", "callback_data": f"wgc:list:{page - 1}"})
+        navigation.append({"text": "🔄", "callback_data": f"wgc:list:{page}"})
+        if page < pages - 1:
+            navigation.append({"text": "▶️", "callback_data": f"wgc:list:{page + 1}"})
+        keyboard.append(navigation)
+        return text, {"inline_keyboard": keyboard}
+    
+    def get_client_card(self, client_id: str) -> tuple[str, Optional[Dict[str, Any]]]:
+        """Карточка клиента с действиями"""
+        try:
+            client = self.wg_api.get_client(client_id)
+        except WGEasyAPIError as e:
+            return f"❌ Ошибка API wg-easy: {str(e)}", None
+        back = {"inline_keyboard": [[{"text": "◀️ К списку", "callback_data": "wgc:list:0"}]]}
+        if client is None:
+            return "❌ Клиент не найден", back
+        
+        enabled = client.get("enabled", True)
+        handshake = client.get("latestHandshakeAt") or "нет"
+        text = f"""🔑 *{md_escape(client.get("name", "?"))}*
+
+{"🟢 Включен" if enabled else "⚪ Отключен"}
+🌐 *Адрес*: {client.get("address", "—")}
+🤝 *Рукопожатие*: {handshake}
+⬇️ *Получено*: {format_bytes(client.get("transferRx") or 0)}
+⬆️ *Отправлено*: {format_bytes(client.get("transferTx") or 0)}"""
+        keyboard = [
+            [{"text": "⚪ Отключить" if enabled else "🟢 Включить",
+              "callback_data": f"wgc:{'off' if enabled else 'on'}:{client_id}"}],
+            [{"text": "📄 Конфиг", "callback_data": f"wgc:conf:{client_id}"},
+             {"text": "📱 QR-код", "callback_data": f"wgc:qr:{client_id}"}],
+            [{"text": "🗑 Удалить", "callback_data": f"wgc:del:{client_id}"}],
+            back["inline_keyboard"][0],
+        ]
+        return text, {"inline_keyboard": keyboard}
+    
+    def handle_client_action(self, chat_id: int, message_id: int, action: str, arg: str) -> None:
+        """Действие над клиентами wg-easy (выполняется в пуле)"""
+        if not self.wg_api:
+            self.send_message(chat_id, "❌ WG_EASY_URL не задан, управление клиентами недоступно")
+            return
+        try:
+            if action == "list":
+                text, keyboard = self.get_clients_page(int(arg) if arg.isdigit() else 0)
+            elif action == "show":
+                text, keyboard = self.get_client_card(arg)
+            elif action in ("on", "off"):
+                self.wg_api.set_enabled(arg, action == "on")
+                text, keyboard = self.get_client_card(arg)
+            elif action == "del":
+                client = self.wg_api.get_client(arg) or {}
+                text = f"🗑 *Удалить клиента {md_escape(client.get('name', '?'))}?*\n\nКонфигурация перестанет работать."
+                keyboard = {"inline_keyboard": [
+                    [{"text": "✅ Да, удалить", "callback_data": f"wgc:delok:{arg}"}],
+                    [{"text": "❌ Отмена", "callback_data": f"wgc:show:{arg}"}],
+                ]}
+            elif action == "delok":
+                self.wg_api.delete_client(arg)
+                text, keyboard = self.get_clients_page(0)
+            elif action in ("conf", "qr"):
+                client = self.wg_api.get_client(arg) or {}
+                name = client.get("name", "client")
+                if action == "conf":
+                    self.send_document(chat_id, f"{name}.conf", self.wg_api.get_config(arg), f"📄 Конфигурация {md_escape(name)}")
+                else:
+                    self.send_document(chat_id, f"{name}.svg", self.wg_api.get_qrcode(arg), f"📱 QR-код {md_escape(name)}")
+                return
+            else:
+                return
+        except WGEasyAPIError as e:
+            self.send_message(chat_id, f"❌ Ошибка API wg-easy: {str(e)}")
+            return
+        self.edit_message(chat_id, message_id, text, keyboard)
+    
+    def create_client(self, name: str) -> str:
+        """Создать клиента wg-easy"""
+        if not self.wg_api:
+            return "❌ WG_EASY_URL не задан, управление клиентами недоступно"
+        try:
+            self.wg_api.create_client(name)
+        except WGEasyAPIError as e:
+            return f"❌ Ошибка создания клиента: {str(e)}"
+        return f"✅ Клиент *{md_escape(name)}* создан. Список: /clients"
+    
+    def run_command(self, chat_id: int, key: str, func, ack_text: str,
+                    reply_markup: Optional[Dict] = None) -> str:
+        """Выполнить долгую команду в пуле, не блокируя прием обновлений"""
+        def reply(target_chat: int, text: str):
+            self.send_message(target_chat, text, reply_markup)
+        return self.dispatcher.submit(key, chat_id, func, reply, ack_text, notify=self.send_message)
+    
     def toggle_monitoring(self) -> str:
         """Переключить мониторинг"""
         self.monitoring_enabled = not self.monitoring_enabled
+        self.state.set("monitoring_enabled", self.monitoring_enabled)
+        self.scheduler.set_paused(not self.monitoring_enabled)
         status = "включен" if self.monitoring_enabled else "отключен"
         return f"🔔 Мониторинг {status}"
     
+    def _container_status(self, timeout: float, container: str = WG_EASY_CONTAINER) -> str:
+        """Статус контейнера в формате docker ps; пустая строка, если не запущен"""
+        if self.docker:
+            try:
+                return self.docker.container_status(container, timeout=timeout)
+            except DockerTimeout:
+                # Демон завис: docker CLI упрется в тот же сокет и только удвоит ожидание
+                raise
+            except DockerError as e:
+                logger.error(f"Docker API: {e}, используем docker CLI")
+        result = subprocess.run(
+            ["docker", "ps", "--filter", f"name={container}", "--format", "{{.Status}}"],
+            capture_output=True, text=True, timeout=timeout
+        )
+        return result.stdout.strip()
+    
+    def _container_identity(self) -> Optional[Tuple[str, int]]:
+        """(полный id, pid) основного контейнера; None, если он не запущен"""
+        container = self.primary.container
+        try:
+            if self.docker:
+                try:
+                    info = self.docker.inspect_container(container)
+                    pid = info.get("State", {}).get("Pid", 0)
+                    return (info["Id"], pid) if pid else None
+                except DockerError as e:
+                    if e.status:
+                        return None
+                    if isinstance(e, DockerTimeout):
+                        logger.error(f"Не удалось определить контейнер {container}: {e}")
+                        return None
+                    logger.error(f"Docker API: {e}, используем docker CLI")
+            result = subprocess.run(
+                ["docker", "inspect", "--format", "{{.Id}} {{.State.Pid}}", container],
+                capture_output=True, text=True, timeout=5
+            )
+            container_id, _, pid = result.stdout.strip().partition(" ")
+            return (container_id, int(pid)) if result.returncode == 0 and pid not in ("", "0") else None
+        except (OSError, ValueError, subprocess.SubprocessError) as e:
+            logger.error(f"Не удалось определить контейнер {container}: {e}")
+            return None
+    
+    def _container_exec(self, cmd: list, timeout: float, container: str = WG_EASY_CONTAINER) -> int:
+        """Выполнить команду в контейнере и вернуть код возврата"""
+        return self._container_run(cmd, timeout, container)[0]
+    
+    def _container_run(self, cmd: list, timeout: float, container: str = WG_EASY_CONTAINER) -> tuple[int, str]:
+        """Выполнить команду в контейнере и вернуть (код возврата, stdout)"""
+        if self.docker:
+            try:
+                return self.docker.exec_run(container, cmd, timeout=timeout)
+            except DockerError as e:
+                if e.status or isinstance(e, DockerTimeout):
+                    return 1, ""
+                logger.error(f"Docker API: {e}, используем docker CLI")
+        result = subprocess.run(
+            ["docker", "exec", container, *cmd],
+            capture_output=True, text=True, timeout=timeout
+        )
+        return result.returncode, result.stdout
+    
+    def _container_logs(self, container: str, since: Optional[str], tail: Optional[int],
+                        follow: bool) -> Iterator[str]:
+        """Строки лога контейнера с метками времени (поток при follow)"""
+        if self.docker:
+            try:
+                yield from self.docker.logs(container, since=since, tail=tail, follow=follow)
+                return
+            except DockerError as e:
+                if e.status or isinstance(e, DockerTimeout):
+                    raise
+                logger.error(f"Docker API: {e}, используем docker CLI")
+        cmd = ["docker", "logs", "--timestamps"]
+        if since:
+            cmd += ["--since", since]
+        if tail is not None:
+            cmd += ["--tail", str(tail)]
+        if follow:
+            cmd.append("--follow")
+        process = subprocess.Popen([*cmd, container], stdout=subprocess.PIPE,
+                                   stderr=subprocess.STDOUT, text=True, errors="replace")
+        try:
+            for line in process.stdout:
+                yield line.rstrip("\n")
+        finally:
+            process.kill()
+            process.wait()
+    
+    def _container_restart(self, timeout: float, container: str = WG_EASY_CONTAINER) -> Optional[str]:
+        """Перезапустить контейнер; вернуть текст ошибки или None при успехе"""
+        if self.docker:
+            try:
+                self.docker.restart_container(container)
+                return None
+            except DockerError as e:
+                # После таймаута перезапуск мог уже начаться — повтор через CLI перезапустил бы дважды
+                if e.status or isinstance(e, DockerTimeout):
+                    return str(e)
+                logger.error(f"Docker API: {e}, используем docker CLI")
+        result = subprocess.run(
+            ["docker", "restart", container], capture_output=True, text=True, timeout=timeout
+        )
+        if result.returncode != 0:
+            return result.stderr.strip() or result.stdout.strip()
+        return None
+    
     def _get_memory_usage(self) -> str:
-        """Получить использование памяти"""
+        """Получить использование памяти (из /proc/meminfo)"""
         try:
-            result = subprocess.run(["free", "-h"], capture_output=True, text=True, timeout=2)
-            lines = result.stdout.split('\n')[1].split()
-            used = lines[2]
-            total = lines[1]
-            return f"{used}/{total}"
-        except:
+            used, total = memory_usage()
+            return f"{format_bytes(used)}/{format_bytes(total)}"
+        except Exception:
             return "N/A"
     
     def _get_disk_usage(self) -> str:
-        """Получить использование диска"""
+        """Получить использование диска (через statvfs)"""
         try:
-            result = subprocess.run(["df", "-h", "/"], capture_output=True, text=True, timeout=2)
-            lines = result.stdout.split('\n')[1].split()
-            used = lines[2]
-            total = lines[1]
-            return f"{used}/{total}"
-        except:
+            used, total = disk_usage("/")
+            return f"{format_bytes(used)}/{format_bytes(total)}"
+        except OSError:
             return "N/A"
     
     def start_monitoring(self):
-        """Запустить мониторинг в отдельном потоке"""
-        if self.monitor_thread and self.monitor_thread.is_alive():
+        """Запустить мониторинг всех целей"""
+        if self.events_thread and self.events_thread.is_alive():
             return
         
-        # Инициализируем прошлый статус перед стартом цикла
-        try:
-            is_healthy, status_msg = self.check_wg_easy_status()
-            self.last_status = is_healthy
-            if not is_healthy:
-                current_time = datetime.now().strftime("%H:%M:%S")
-                alert_message = f"""🚨 *АЛЕРТ: WG-Easy недоступен!*
-
-⏰ *Время*: {current_time}
-❌ *Статус*: {status_msg}
-🔧 *Рекомендация*: Проверьте контейнер и перезапустите при необходимости"""
-                self.send_message(ADMIN_ID, alert_message)
-        except Exception as e:
-            logger.error(f"Инициализация статуса мониторинга: {e}")
-        
         self.stop_monitoring = False
-        self.monitor_thread = threading.Thread(target=self._monitor_loop, daemon=True)
-        self.monitor_thread.start()
+        if self._use_events():
+            # События дают мгновенную реакцию, опрос контейнеров остается страховкой
+            for target in self.targets:
+                if target.container:
+                    target.interval = max(target.interval, MONITOR_SAFETY_INTERVAL)
+            self.events_thread = threading.Thread(target=self._events_loop, daemon=True)
+            self.events_thread.start()
+        # Первая проверка всех целей выполняется сразу; алерт — только если статус
+        # отличается от сохраненного с прошлого запуска (и подтвержден перепроверками)
+        self.scheduler.set_paused(not self.monitoring_enabled)
+        self.scheduler.start()
         print("Мониторинг запущен")
     
     def stop_monitoring_thread(self):
         """Остановить мониторинг"""
         self.stop_monitoring = True
-        if self.monitor_thread:
-            self.monitor_thread.join(timeout=2)
+        self.scheduler.stop()
         print("Мониторинг остановлен")
     
-    def _monitor_loop(self):
-        """Основной цикл мониторинга"""
-        print("Запуск цикла мониторинга")
-        
-        while not self.stop_monitoring and self.monitoring_enabled:
-            try:
-                is_healthy, status_msg = self.check_wg_easy_status()
-                current_time = datetime.now().strftime("%H:%M:%S")
-                
-                # Если статус изменился с рабочего на нерабочий
-                if self.last_status is True and not is_healthy:
-                    alert_message = f"""🚨 *АЛЕРТ: WG-Easy недоступен!*
+    def _use_events(self) -> bool:
+        """Использовать ли поток событий Docker для мониторинга"""
+        if MONITOR_MODE == "poll" or not self.docker:
+            return False
+        if not any(target.container for target in self.targets):
+            return False
+        return MONITOR_MODE == "events" or self.docker.ping()
+    
+    def _target_line(self, target: Target) -> str:
+        if len(self.targets) == 1:
+            return ""
+        return f"🎯 *Цель*: {md_escape(target.name)}\n"
+    
+    def _alert_message(self, target: Target, status_msg: str) -> str:
+        current_time = datetime.now().strftime("%H:%M:%S")
+        return f"""🚨 *АЛЕРТ: WG-Easy недоступен!*
 
-⏰ *Время*: {current_time}
+{self._target_line(target)}⏰ *Время*: {current_time}
 ❌ *Статус*: {status_msg}
 🔧 *Рекомендация*: Проверьте контейнер и перезапустите при необходимости"""
-                    
-                    print(f"WG-Easy недоступен: {status_msg}")
-                    self.send_message(ADMIN_ID, alert_message)
-                
-                # Если статус изменился с нерабочего на рабочий
-                elif self.last_status is False and is_healthy:
-                    recovery_message = f"""✅ *ВОССТАНОВЛЕНИЕ: WG-Easy работает!*
+    
+    def _recovery_message(self, target: Target, status_msg: str) -> str:
+        current_time = datetime.now().strftime("%H:%M:%S")
+        return f"""✅ *ВОССТАНОВЛЕНИЕ: WG-Easy работает!*
 
-⏰ *Время*: {current_time}
+{self._target_line(target)}⏰ *Время*: {current_time}
 ✅ *Статус*: {status_msg}
 🎉 *Сервер восстановлен*"""
-                    
-                    print(f"WG-Easy восстановлен: {status_msg}")
-                    self.send_message(ADMIN_ID, recovery_message)
-                
-                self.last_status = is_healthy
-                
-                # Ждем перед следующей проверкой
-                time.sleep(MONITOR_INTERVAL)
-                
+    
+    def _on_log_alert(self, target: Target, pattern: str, line: str, before: List[str],
+                      after: List[str], repeats: int):
+        """Алерт по строке лога с контекстом вокруг нее"""
+        if not self.monitoring_enabled:
+            return
+        context = "\n".join([*before, f"» {line}", *after]).replace("```", "'''")
+        text = f"📜 *Лог {md_escape(target.name)}*: {md_escape(pattern)}\n```\n{context[-3000:]}\n```"
+        if repeats:
+            text += f"\nПовторялось еще {repeats} раз(а) с прошлого алерта"
+        self.broadcast_alert("logs", text)
+    
+    def get_logs(self, args: List[str]) -> str:
+        """Последние строки лога из буфера: /logs [цель] [число]"""
+        count = LOGS_DEFAULT_LINES
+        name = self.primary.name
+        for arg in args:
+            if arg.isdigit():
+                count = max(1, min(int(arg), LOG_BUFFER_LINES))
+            else:
+                name = arg
+        watcher = self.log_watchers.get(name)
+        if watcher is None:
+            if not self.log_watchers:
+                return "❌ Наблюдение за логами отключено (LOG_WATCH)"
+            return f"❌ Нет лога для цели {md_escape(name)}"
+        lines = watcher.tail(count)
+        if not lines:
+            return f"📜 *Лог {md_escape(name)}*: пока пусто"
+        # Сообщение Telegram ограничено 4096 символами — отрезаем самые старые строки
+        body = "\n".join(lines).replace("```", "'''")[-3800:]
+        return f"📜 *Лог {md_escape(name)}* (последние {len(lines)} строк)\n```\n{body}\n```"
+    
+    def _on_probe_result(self, target: Target, is_healthy: bool, status_msg: str):
+        """Результат плановой проверки: в историю и на обработку смены статуса"""
+        self.history.record_probe(target.name, is_healthy, target.last_latency or 0.0)
+        confirmed = target.health.state
+        if confirmed is None or confirmed != is_healthy:
+            # Единичный сбой (или успех после сбоя) ждет подтверждения перепроверками
+            target.last_message = f"{status_msg} (перепроверка)"
+            return
+        self._update_status(target, confirmed, status_msg)
+    
+    def _restore_health(self):
+        """Вернуть последнее известное здоровье целей: без смены статуса нет и алерта"""
+        saved = self.state.get("health", {})
+        for target in self.targets:
+            if target.name in saved:
+                target.last_ok = saved[target.name]["ok"]
+                target.last_message = saved[target.name]["message"]
+                target.health.reset(target.last_ok)
+    
+    def _save_health(self):
+        self.state.set("health", {target.name: {"ok": target.last_ok, "message": target.last_message}
+                                  for target in self.targets if target.last_ok is not None})
+    
+    def _update_status(self, target: Target, is_healthy: bool, status_msg: str):
+        """Учесть новый статус цели и отправить алерт при его смене"""
+        with self._status_lock:
+            previous = target.last_ok
+            target.last_ok = is_healthy
+            target.last_message = status_msg
+            if previous != is_healthy:
+                self._save_health()
+            
+            # Статус изменился с рабочего на нерабочий (или цель не работает при старте)
+            went_down = previous is not False and not is_healthy
+            # Статус изменился с нерабочего на рабочий
+            recovered = previous is False and is_healthy
+            if went_down or recovered:
+                self.history.record_transition(target.name, is_healthy, status_msg)
+            
+            if not self.monitoring_enabled:
+                return
+            
+            if went_down:
+                print(f"{target.name} недоступен: {status_msg}")
+                self.broadcast_alert("down", self._alert_message(target, status_msg))
+            
+            elif recovered:
+                print(f"{target.name} восстановлен: {status_msg}")
+                self.broadcast_alert("recovery", self._recovery_message(target, status_msg))
+    
+    def _events_loop(self):
+        """Реакция на события контейнеров из потока Docker /events"""
+        filters = {
+            "type": ["container"],
+            "container": [target.container for target in self.targets if target.container],
+            "event": ["die", "stop", "start", "health_status"],
+        }
+        since = None
+        
+        while not self.stop_monitoring:
+            try:
+                for event in self.docker.events(filters, since=since):
+                    if self.stop_monitoring:
+                        return
+                    since = event.get("time", since)
+                    if self.monitoring_enabled:
+                        self._handle_container_event(event)
             except Exception as e:
-                logger.error(f"Ошибка в цикле мониторинга: {e}")
-                time.sleep(MONITOR_INTERVAL)
+                logger.error(f"Ошибка потока событий Docker: {e}")
+            
+            # После разрыва потока сверяем состояние опросом и переподключаемся
+            for target in self.targets:
+                if target.container:
+                    self.scheduler.trigger(target.name)
+            time.sleep(5)
+    
+    def _handle_container_event(self, event: Dict[str, Any]):
+        """Обработать одно событие контейнера"""
+        attributes = event.get("Actor", {}).get("Attributes", {})
+        target = self.scheduler.by_container(attributes.get("name", WG_EASY_CONTAINER))
+        if target is None:
+            return
+        action = event.get("Action", event.get("status", ""))
+        if action in ("die", "stop"):
+            exit_code = attributes.get("exitCode")
+            reason = f"Контейнер остановлен ({action}, код {exit_code})" if exit_code else f"Контейнер остановлен ({action})"
+            # Событие Docker надежно, подтверждение перепроверками не нужно
+            target.health.reset(False)
+            self._update_status(target, False, reason)
+        elif action == "health_status: unhealthy":
+            target.health.reset(False)
+            self._update_status(target, False, "Healthcheck контейнера: unhealthy")
+        else:
+            # start / healthy — подтверждаем полной проверкой вне очереди
+            self.scheduler.trigger(target.name)
 
 def create_main_menu() -> Dict[str, Any]:
     """Создать главное меню"""
@@ -325,6 +1037,44 @@ def create_main_menu() -> Dict[str, Any]:
         ]
     }
 
+def create_status_keyboard(target_names: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Создать кнопку обновления статуса и кнопки подробностей по целям"""
+    keyboard = [[{"text": "🔄 Обновить", "callback_data": "status_refresh"}]]
+    if target_names and len(target_names) > 1:
+        buttons = [{"text": f"🎯 {name}", "callback_data": f"target:{name}"} for name in target_names]
+        keyboard += [buttons[i:i + 2] for i in range(0, len(buttons), 2)]
+    return {"inline_keyboard": keyboard}
+
+def create_history_keyboard(target_names: List[str]) -> Optional[Dict[str, Any]]:
+    """Кнопки выбора цели для истории (если целей несколько)"""
+    if len(target_names) < 2:
+        return None
+    buttons = [{"text": f"📈 {name}", "callback_data": f"history:{name}"} for name in target_names]
+    return {"inline_keyboard": [buttons[i:i + 2] for i in range(0, len(buttons), 2)]}
+
+def md_escape(text: str) -> str:
+    """Экранировать спецсимволы Markdown в именах"""
+    for char in ("_", "*", "`", "["):
+        text = text.replace(char, f"\\{char}")
+    return text
+
+def format_age(seconds: float) -> str:
+    """Возраст данных для отображения в статусе"""
+    if seconds < 2:
+        return "только что"
+    if seconds < 120:
+        return f"{int(seconds)} с назад"
+    return f"{int(seconds // 60)} мин назад"
+
+def send_status(bot: WGEasyBot, chat_id: int, refresh: bool = False) -> None:
+    """Ответить статусом из кэша; свежий сбор выполняется в пуле"""
+    keyboard = create_status_keyboard([target.name for target in bot.targets])
+    if not refresh and bot.collector.snapshot() is not None:
+        bot.send_message(chat_id, bot.get_server_status(), keyboard)
+        return
+    bot.run_command(chat_id, "status", lambda: bot.get_server_status(refresh=True),
+                    "⏳ Обновляю статус...", keyboard)
+
 def create_restart_confirmation() -> Dict[str, Any]:
     """Создать меню подтверждения перезагрузки"""
     return {
@@ -338,21 +1088,28 @@ def handle_message(bot: WGEasyBot, message: Dict[str, Any]) -> None:
     """Обработать сообщение"""
     chat_id = message["chat"]["id"]
     text = message.get("text", "")
+    if text.startswith("/"):
+        # В группах команды приходят как /status@имя_бота
+        command, _, rest = text.partition(" ")
+        text = command.split("@", 1)[0] + (f" {rest}" if rest else "")
     
-    if chat_id != ADMIN_ID:
+    subscriber = bot.subscribers.get(chat_id)
+    if subscriber is None:
         bot.send_message(chat_id, "❌ Доступ запрещен")
         return
+    action = command_label(text)
+    if action != "other" and not subscriber.can(action):
+        bot.send_message(chat_id, "⛔ Недостаточно прав для этой команды")
+        return
     
     if text == "/start" or text == "start" or text == "🧭 Меню":
         bot.send_message(chat_id, "🤖 *WG-Easy Bot с мониторингом*\nГотов к работе.")
         
     elif text in ("/status", "📊 Статус"):
-        status = bot.get_server_status()
-        bot.send_message(chat_id, status)
+        send_status(bot, chat_id)
      
     elif text in ("/speed", "🚀 Скорость"):
-        speed = bot.get_speed_test()
-        bot.send_message(chat_id, speed)
+        bot.run_command(chat_id, "speed", bot.get_speed_test, f"⏳ Тест скорости запущен, это займет до {SPEEDTEST_BUDGET:.0f} с...")
      
     elif text in ("/restart", "🔄 Перезагрузка"):
         keyboard = create_restart_confirmation()
@@ -365,23 +1122,84 @@ def handle_message(bot: WGEasyBot, message: Dict[str, Any]) -> None:
     elif text in ("/monitoring", "🔔 Мониторинг"):
         monitor_status = bot.toggle_monitoring()
         bot.send_message(chat_id, monitor_status)
+    
+    elif text == "/peers":
+        text, keyboard = bot.get_peers_page()
+        bot.send_message(chat_id, text, keyboard)
+    
+    elif text == "/top":
+        bot.send_message(chat_id, bot.get_top_peers())
+    
+    elif text == "/clients":
+        bot.dispatcher.run("clients", chat_id, lambda: bot.send_message(chat_id, *bot.get_clients_page(force=True)),
+                           bot.send_message)
+    
+    elif text.startswith("/newclient"):
+        name = text[len("/newclient"):].strip()
+        if not name or len(name) > 32:
+            bot.send_message(chat_id, "Использование: `/newclient имя` (до 32 символов)")
+        else:
+            bot.run_command(chat_id, f"newclient:{name}", lambda: bot.create_client(name), "⏳ Создаю клиента...")
+    
+    elif text == "/logs" or text.startswith("/logs "):
+        bot.send_message(chat_id, bot.get_logs(text.split()[1:]))
+    
+    elif text == "/history":
+        bot.send_message(chat_id, bot.get_history(),
+                         create_history_keyboard([target.name for target in bot.targets]))
+    
+    elif text == "/alerts":
+        bot.send_message(chat_id, *bot.get_alert_settings(chat_id))
+    
+    elif text == "/subscribers":
+        bot.send_message(chat_id, bot.get_subscribers())
 
 def handle_callback(bot: WGEasyBot, callback_query: Dict[str, Any]) -> None:
     """Обработать нажатие кнопки"""
-    chat_id = callback_query["message"]["chat"]["id"]
-    data = callback_query["data"]
+    message = callback_query.get("message") or {}
+    chat_id = message.get("chat", {}).get("id")
+    data = callback_query.get("data", "")
+    # У кнопок под слишком старыми или inline-сообщениями message нет — отвечать некуда
+    if chat_id is None:
+        return
     
-    if chat_id != ADMIN_ID:
+    subscriber = bot.subscribers.get(chat_id)
+    if subscriber is None:
         bot.send_message(chat_id, "❌ Доступ запрещен")
         return
+    if not subscriber.can(data.split(":", 1)[0]):
+        bot.send_message(chat_id, "⛔ Недостаточно прав для этого действия")
+        return
     
     if data == "status":
-        status = bot.get_server_status()
-        bot.send_message(chat_id, status)
+        send_status(bot, chat_id)
+    
+    elif data == "status_refresh":
+        send_status(bot, chat_id, refresh=True)
+    
+    elif data.startswith("wgc:"):
+        _, action, arg = data.split(":", 2)
+        message_id = message["message_id"]
+        bot.dispatcher.run(data, chat_id, lambda: bot.handle_client_action(chat_id, message_id, action, arg),
+                           bot.send_message)
+    
+    elif data.startswith("peers:"):
+        text, keyboard = bot.get_peers_page(int(data.split(":", 1)[1]))
+        bot.edit_message(chat_id, message["message_id"], text, keyboard)
+    
+    elif data.startswith("alerts:"):
+        bot.toggle_alert(chat_id, data.split(":", 1)[1])
+        bot.edit_message(chat_id, message["message_id"], *bot.get_alert_settings(chat_id))
+    
+    elif data.startswith("history:"):
+        bot.send_message(chat_id, bot.get_history(data.split(":", 1)[1]))
+    
+    elif data.startswith("target:"):
+        name = data.split(":", 1)[1]
+        bot.run_command(chat_id, data, lambda: bot.get_target_detail(name), "⏳ Проверяю цель...")
         
     elif data == "speed":
-        speed = bot.get_speed_test()
-        bot.send_message(chat_id, speed)
+        bot.run_command(chat_id, "speed", bot.get_speed_test, f"⏳ Тест скорости запущен, это займет до {SPEEDTEST_BUDGET:.0f} с...")
         
     elif data == "restart":
         keyboard = create_restart_confirmation()
@@ -392,8 +1210,7 @@ def handle_callback(bot: WGEasyBot, callback_query: Dict[str, Any]) -> None:
         )
         
     elif data == "restart_confirm":
-        result = bot.restart_container()
-        bot.send_message(chat_id, result)
+        bot.run_command(chat_id, "restart", bot.restart_container, "⏳ Перезапускаю контейнер...")
         
     elif data == "cancel":
         bot.send_message(chat_id, "❌ Перезагрузка отменена")
@@ -404,6 +1221,113 @@ def handle_callback(bot: WGEasyBot, callback_query: Dict[str, Any]) -> None:
     
     # Больше не отправляем дублирующее меню; постоянные кнопки уже видны
 
+# Кнопки постоянной клавиатуры -> команды (для меток метрик)
+BUTTON_COMMANDS = {
+    "📊 Статус": "/status",
+    "🚀 Скорость": "/speed",
+    "🔄 Перезагрузка": "/restart",
+    "🔔 Мониторинг": "/monitoring",
+    "🧭 Меню": "/start",
+}
+
+KNOWN_COMMANDS = {"/start", "start", "/status", "/speed", "/restart", "/monitoring",
+                  "/peers", "/top", "/clients", "/newclient", "/history", "/logs",
+                  "/alerts", "/subscribers"}
+
+# Префиксы данных кнопок (для меток метрик)
+KNOWN_CALLBACKS = {"status", "status_refresh", "speed", "restart", "restart_confirm", "cancel",
+                   "monitoring", "peers", "history", "target", "alerts", "wgc"}
+
+def callback_label(data: str) -> str:
+    """Префикс данных кнопки с ограниченным набором значений"""
+    prefix = data.split(":", 1)[0]
+    return prefix if prefix in KNOWN_CALLBACKS else "other"
+
+def command_label(text: str) -> str:
+    """Команда сообщения с ограниченным набором значений"""
+    if text in BUTTON_COMMANDS:
+        return BUTTON_COMMANDS[text]
+    command = text.split(maxsplit=1)[0] if text else ""
+    return command if command in KNOWN_COMMANDS else "other"
+
+# Команды и кнопки только для чтения: повтор дает тот же ответ, из очереди достаточно последнего
+READ_ONLY_COMMANDS = {"/start", "start", "/status", "/speed", "/restart", "/peers", "/top",
+                      "/clients", "/history", "/logs", "/alerts", "/subscribers"}
+READ_ONLY_CALLBACKS = {"status", "status_refresh", "speed", "restart", "cancel", "peers",
+                       "history", "target", "wgc:list", "wgc:show", "wgc:del", "wgc:conf", "wgc:qr"}
+# Подтверждения опасных действий из очереди не выполняем, а спрашиваем заново
+RECONFIRM_CALLBACKS = {"restart_confirm": "restart", "wgc:delok": "wgc:del"}
+
+def callback_action(data: str) -> str:
+    """Действие кнопки: у кнопок клиентов — wgc:<действие>, у остальных — префикс"""
+    parts = data.split(":")
+    return ":".join(parts[:2]) if parts[0] == "wgc" else parts[0]
+
+def update_kind(update: Dict[str, Any]) -> tuple:
+    """Ключ схлопывания очереди; у изменяющих состояние обновлений он уникален"""
+    if "message" in update:
+        message = update["message"]
+        text = message.get("text", "")
+        args = ""
+        if text.startswith("/"):
+            # /status@имя_бота из группы — та же команда; аргументы различают запросы
+            command, _, args = text.partition(" ")
+            text = command.split("@", 1)[0]
+        label = command_label(text)
+        chat_id = message.get("chat", {}).get("id")
+        if label in READ_ONLY_COMMANDS and chat_id is not None:
+            return chat_id, "message", label, " ".join(args.split())
+    elif "callback_query" in update:
+        callback = update["callback_query"]
+        data = callback.get("data", "")
+        # Без message чат неизвестен — такое обновление не схлопываем
+        chat_id = (callback.get("message") or {}).get("chat", {}).get("id")
+        if callback_action(data) in READ_ONLY_CALLBACKS and chat_id is not None:
+            return chat_id, "callback", data
+    return None, "update", update.get("update_id")
+
+def reconfirm(update: Dict[str, Any]) -> Dict[str, Any]:
+    """Заменить подтверждение опасного действия на повторный вопрос"""
+    callback = update.get("callback_query")
+    if callback is None:
+        return update
+    data = callback.get("data", "")
+    prompt = RECONFIRM_CALLBACKS.get(callback_action(data))
+    if prompt is None:
+        return update
+    rest = data.split(":")[2:]
+    callback = dict(callback, data=":".join([prompt] + rest))
+    return dict(update, callback_query=callback)
+
+def collapse_backlog(updates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Разобрать накопившиеся обновления
+
+    Из одинаковых запросов только для чтения остается последний, изменения
+    (/newclient, включение клиентов, подписки) сохраняются все и по порядку,
+    а подтверждения перезапуска и удаления превращаются в повторный вопрос.
+    """
+    latest: Dict[tuple, Dict[str, Any]] = {}
+    for update in map(reconfirm, updates):
+        latest[update_kind(update)] = update
+    return sorted(latest.values(), key=lambda update: update["update_id"])
+
+def dispatch_update(bot: WGEasyBot, update: Dict[str, Any]) -> None:
+    """Передать обновление обработчику; долгие команды уходят в пул"""
+    try:
+        if "message" in update:
+            text = update["message"].get("text", "")
+            with metrics.HANDLER_SECONDS.time("message", command_label(text)):
+                handle_message(bot, update["message"])
+        elif "callback_query" in update:
+            data = update["callback_query"].get("data", "")
+            with metrics.HANDLER_SECONDS.time("callback", callback_label(data)):
+                handle_callback(bot, update["callback_query"])
+    except Exception as e:
+        logger.error(f"Ошибка обработки обновления {update.get('update_id')}: {e}")
+
+def _terminate(signum, frame):
+    raise KeyboardInterrupt
+
 def main():
     """Основная функция"""
     print("Запуск WG-Easy Telegram Bot с мониторингом...")
@@ -417,43 +1341,131 @@ def main():
         print("ОШИБКА: ADMIN_ID не установлен!")
         exit(1)
     
+    if BOT_MODE == "webhook" and not WEBHOOK_URL:
+        print("ОШИБКА: для BOT_MODE=webhook нужен WEBHOOK_URL!")
+        exit(1)
+    
     bot = WGEasyBot()
-    last_update_id = 0
     
-    # Запускаем мониторинг
+    if METRICS_PORT:
+        metrics.SEND_QUEUE_DEPTH.func = bot.outbox.depth
+        metrics.start_http_server(METRICS_PORT, METRICS_LISTEN)
+        print(f"Метрики Prometheus: http://{METRICS_LISTEN}:{METRICS_PORT}/metrics")
+    
+    # docker stop шлет SIGTERM — завершаемся штатно, чтобы сохранить состояние
+    signal.signal(signal.SIGTERM, _terminate)
+    
+    # Запускаем сохранение состояния, отправку, мониторинг и фоновый сбор статуса
+    bot.state.start()
+    bot.outbox.start()
     bot.start_monitoring()
+    bot.collector.start()
+    for watcher in bot.log_watchers.values():
+        watcher.start()
     
     try:
-        while True:
-            try:
-                # Получаем обновления
-                response = bot.session.get(
-                    f"{BASE_URL}/getUpdates", 
-                    params={"offset": last_update_id + 1, "timeout": 30}
-                )
-                response.raise_for_status()
-                updates = response.json()
-                
-                if updates["ok"]:
-                    for update in updates["result"]:
-                        last_update_id = update["update_id"]
-                        
-                        if "message" in update:
-                            handle_message(bot, update["message"])
-                        elif "callback_query" in update:
-                            handle_callback(bot, update["callback_query"])
-                
-                time.sleep(1)
-                
-            except Exception as e:
-                logger.error(f"Ошибка в основном цикле: {e}")
-                time.sleep(5)
-                
+        if BOT_MODE == "webhook":
+            run_webhook(bot)
+        else:
+            run_polling(bot)
     except KeyboardInterrupt:
         print("Получен сигнал остановки...")
     finally:
         bot.stop_monitoring_thread()
+        bot.collector.stop()
+        for watcher in bot.log_watchers.values():
+            watcher.stop()
+        bot.dispatcher.shutdown()
+        bot.outbox.stop()
+        bot.state.stop()
         print("Бот остановлен")
 
+def run_polling(bot: WGEasyBot) -> None:
+    """Получать обновления через long polling"""
+    # Активный webhook блокирует getUpdates
+    try:
+        bot.session.post(f"{BASE_URL}/deleteWebhook", timeout=10)
+    except requests.RequestException as e:
+        logger.error(f"Не удалось снять webhook: {e}")
+    
+    last_update_id = bot.state.get("offset", 0)
+    last_update_id = drain_backlog(bot, last_update_id)
+    while True:
+        try:
+            # Получаем обновления; ожидание целиком на стороне long polling
+            try:
+                with metrics.TELEGRAM_SECONDS.time("getUpdates"):
+                    response = bot.session.get(
+                        f"{BASE_URL}/getUpdates", 
+                        params={"offset": last_update_id + 1, "timeout": POLL_TIMEOUT},
+                        timeout=POLL_TIMEOUT + 10
+                    )
+                response.raise_for_status()
+            except requests.RequestException:
+                metrics.TELEGRAM_ERRORS.inc("getUpdates")
+                raise
+            updates = response.json()
+            
+            if updates["ok"]:
+                for update in updates["result"]:
+                    last_update_id = update["update_id"]
+                    dispatch_update(bot, update)
+                # На диск offset попадет со следующим пакетным сбросом
+                bot.state.set("offset", last_update_id)
+            
+        except Exception as e:
+            logger.error(f"Ошибка в основном цикле: {e}")
+            time.sleep(5)
+
+def drain_backlog(bot: WGEasyBot, last_update_id: int) -> int:
+    """Разобрать накопившиеся за простой обновления одним пакетом (см. collapse_backlog)"""
+    backlog: List[Dict[str, Any]] = []
+    try:
+        while True:
+            response = bot.session.get(
+                f"{BASE_URL}/getUpdates",
+                params={"offset": last_update_id + 1, "timeout": 0, "limit": 100},
+                timeout=10
+            )
+            response.raise_for_status()
+            result = response.json().get("result", [])
+            if not result:
+                break
+            backlog.extend(result)
+            last_update_id = result[-1]["update_id"]
+            if len(result) < 100:
+                break
+    except (requests.RequestException, ValueError) as e:
+        logger.error(f"Не удалось получить накопившиеся обновления: {e}")
+    if backlog:
+        # Смещение сохраняем до разбора, чтобы битое обновление не повторялось после перезапуска
+        bot.state.set("offset", last_update_id)
+        try:
+            selected = collapse_backlog(backlog)
+        except Exception as e:
+            logger.error(f"Не удалось схлопнуть очередь обновлений: {e}")
+            selected = backlog
+        print(f"Накопилось обновлений: {len(backlog)}, обрабатываем {len(selected)}")
+        for update in selected:
+            dispatch_update(bot, update)
+    return last_update_id
+
+def run_webhook(bot: WGEasyBot) -> None:
+    """Получать обновления через встроенный webhook-сервер"""
+    secret = WEBHOOK_SECRET or secrets.token_urlsafe(32)
+    path = urlparse(WEBHOOK_URL).path or "/"
+    server = WebhookServer(WEBHOOK_LISTEN, WEBHOOK_PORT, path, secret,
+                           lambda update: dispatch_update(bot, update))
+    
+    response = bot.session.post(f"{BASE_URL}/setWebhook", data={
+        "url": WEBHOOK_URL,
+        "secret_token": secret,
+        "allowed_updates": json.dumps(["message", "callback_query"]),
+    }, timeout=10)
+    response.raise_for_status()
+    print(f"Webhook установлен: {WEBHOOK_URL}")
+    
+    server.serve_forever()
+
 if __name__ == "__main__":
     main()
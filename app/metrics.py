@@ -0,0 +1,212 @@
+"""
+Метрики в текстовом формате Prometheus
+Пока экспорт не включен (enable()), инструменты возвращаются сразу и почти ничего не стоят
+"""
+
+import bisect
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_metrics: List["_Metric"] = []
+_enabled = False
+
+
+def enable():
+    """Включить сбор метрик"""
+    global _enabled
+    _enabled = True
+
+
+def _escape(value: str) -> str:
+    """Экранировать значение метки: обратная косая черта, кавычка и перевод строки"""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        if not _enabled:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labels, key)} {value:g}" for key, value in items]
+
+
+class Gauge(_Metric):
+    """Значение задается set() или вычисляется функцией в момент опроса"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 func: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self.func = func
+
+    def set(self, value: float, *labels: str):
+        if not _enabled:
+            return
+        with self._lock:
+            self._values[labels] = value
+
+    def _samples(self) -> List[str]:
+        if self.func is not None:
+            return [f"{self.name} {self.func():g}"]
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labels, key)} {value:g}" for key, value in items]
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram: "Histogram", labels: Tuple[str, ...]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return None
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+        # метки -> [счетчики по корзинам..., сумма, количество]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels: str):
+        if not _enabled:
+            return
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [0.0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def time(self, *labels: str):
+        """Контекстный менеджер для замера длительности блока"""
+        return _Timer(self, labels) if _enabled else _NULL_TIMER
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(state)) for key, state in self._values.items()]
+        lines = []
+        for key, state in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                le = _format_labels(self.labels, key, 'le="%g"' % bound)
+                lines.append(f"{self.name}_bucket{le} {cumulative:g}")
+            le = _format_labels(self.labels, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {state[-1]:g}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {state[-2]:g}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {state[-1]:g}")
+        return lines
+
+
+def render() -> str:
+    """Все метрики в текстовом формате Prometheus"""
+    lines: List[str] = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Включить метрики и отдавать их на /metrics в фоновом потоке"""
+    enable()
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# Метрики бота
+PROBE_SECONDS = Histogram("wgbot_probe_seconds", "Длительность проверок по типам", ("probe",))
+PROBE_FAILURES = Counter("wgbot_probe_failures_total", "Неудачные проверки по типам", ("probe",))
+TELEGRAM_SECONDS = Histogram("wgbot_telegram_request_seconds", "Длительность запросов к Telegram Bot API", ("method",))
+TELEGRAM_ERRORS = Counter("wgbot_telegram_errors_total", "Ошибки запросов к Telegram Bot API", ("method",))
+HANDLER_SECONDS = Histogram("wgbot_handler_seconds", "Длительность обработки обновлений", ("handler", "command"))
+COMMAND_SECONDS = Histogram("wgbot_command_seconds", "Длительность долгих команд в пуле", ("command",))
+SEND_QUEUE_DEPTH = Gauge("wgbot_send_queue_depth", "Сообщений в очереди отправки")
+MONITOR_LAG = Gauge("wgbot_monitor_lag_seconds", "Опоздание запуска плановой проверки относительно срока", ("target",))
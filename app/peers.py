@@ -0,0 +1,117 @@
+"""
+Статистика пиров WireGuard по выводу `wg show all dump`
+Разбор за один проход, скорости считаются по разнице счетчиков между циклами
+"""
+
+import heapq
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+class Peer:
+    """Пир WireGuard с текущими счетчиками и скоростями"""
+
+    __slots__ = ("interface", "public_key", "endpoint", "allowed_ips", "handshake",
+                 "rx", "tx", "rx_rate", "tx_rate")
+
+    def __init__(self, interface: str, public_key: str, endpoint: str, allowed_ips: str,
+                 handshake: int, rx: int, tx: int):
+        self.interface = interface
+        self.public_key = public_key
+        self.endpoint = endpoint
+        self.allowed_ips = allowed_ips
+        self.handshake = handshake
+        self.rx = rx
+        self.tx = tx
+        self.rx_rate: Optional[float] = None
+        self.tx_rate: Optional[float] = None
+
+    @property
+    def total_rate(self) -> float:
+        return (self.rx_rate or 0.0) + (self.tx_rate or 0.0)
+
+    @property
+    def address(self) -> str:
+        """Первый адрес из allowed-ips без маски /32"""
+        first = self.allowed_ips.split(",", 1)[0]
+        return first[:-3] if first.endswith("/32") else first
+
+
+def parse_dump(output: str) -> List[Peer]:
+    """Разобрать `wg show all dump`; строки интерфейсов (5 полей) пропускаются"""
+    peers = []
+    for line in output.splitlines():
+        fields = line.split("\t")
+        if len(fields) != 9:
+            continue
+        interface, public_key, _, endpoint, allowed_ips, handshake, rx, tx, _ = fields
+        try:
+            peers.append(Peer(interface, public_key, endpoint, allowed_ips,
+                              int(handshake), int(rx), int(tx)))
+        except ValueError:
+            continue
+    return peers
+
+
+class PeerTracker:
+    """Хранит последний снимок пиров и считает скорости между циклами"""
+
+    def __init__(self, stale_after: float = 180):
+        self.stale_after = stale_after
+        self.peers: List[Peer] = []
+        self.updated_at: Optional[float] = None
+        # public_key -> (rx, tx) с прошлого цикла
+        self._counters: Dict[str, Tuple[int, int]] = {}
+        self._lock = threading.Lock()
+
+    def update(self, output: str, now: Optional[float] = None):
+        """Учесть новый вывод dump"""
+        now = now or time.time()
+        peers = parse_dump(output)
+        with self._lock:
+            previous = self._counters
+            elapsed = now - self.updated_at if self.updated_at else 0.0
+            counters = {}
+            for peer in peers:
+                counters[peer.public_key] = (peer.rx, peer.tx)
+                prev = previous.get(peer.public_key)
+                if prev is not None and elapsed > 0:
+                    # Счетчики сбрасываются при перезапуске интерфейса
+                    peer.rx_rate = max(peer.rx - prev[0], 0) / elapsed
+                    peer.tx_rate = max(peer.tx - prev[1], 0) / elapsed
+            self._counters = counters
+            self.peers = peers
+            self.updated_at = now
+
+    def is_stale(self, peer: Peer, now: Optional[float] = None) -> bool:
+        """Рукопожатия не было или оно старше stale_after"""
+        now = now or time.time()
+        return peer.handshake == 0 or now - peer.handshake > self.stale_after
+
+    def snapshot(self) -> List[Peer]:
+        with self._lock:
+            return self.peers
+
+    def top(self, count: int = 10) -> List[Peer]:
+        """Самые активные пиры по суммарной скорости"""
+        return heapq.nlargest(count, self.snapshot(), key=lambda peer: peer.total_rate)
+
+    def summary(self) -> Tuple[int, int]:
+        """(всего пиров, с актуальным рукопожатием)"""
+        peers = self.snapshot()
+        now = time.time()
+        active = sum(1 for peer in peers if not self.is_stale(peer, now))
+        return len(peers), active
+
+
+def format_rate(bytes_per_second: Optional[float]) -> str:
+    """Скорость в бит/с"""
+    if bytes_per_second is None:
+        return "—"
+    bits = bytes_per_second * 8
+    for unit in ("бит/с", "Кбит/с", "Мбит/с"):
+        if bits < 1000:
+            return f"{bits:.0f} {unit}" if unit == "бит/с" else f"{bits:.1f} {unit}"
+        bits /= 1000
+    return f"{bits:.1f} Гбит/с"
@@ -0,0 +1,359 @@
+"""
+Очередь исходящих сообщений Telegram
+Ограничение частоты (token bucket), учет retry_after и склейка алертов в сводку.
+Несколько потоков доставки работают параллельно, но в один чат — строго по очереди
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+import requests
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Лимиты Telegram: ~30 сообщений/с на бота, ~1/с в личный чат, 20/мин в группу
+GLOBAL_RATE = 30.0
+PRIVATE_CHAT_RATE = 1.0
+GROUP_CHAT_RATE = 20 / 60
+BURST = 3
+MAX_TEXT = 4096
+
+# Итог доставки: (доставлено, описание ошибки)
+DeliveryCallback = Callable[[bool, str], None]
+
+
+class TokenBucket:
+    """Классический token bucket на монотонных часах"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Сколько ждать до появления токена"""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def consume(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+
+class _Message:
+    __slots__ = ("chat_id", "text", "reply_markup", "alert", "message_id", "document", "attempts",
+                 "callbacks")
+
+    def __init__(self, chat_id: int, text: str, reply_markup: Optional[str], alert: bool,
+                 message_id: Optional[int] = None, document: Optional[Tuple[str, bytes]] = None,
+                 callbacks: Optional[List[DeliveryCallback]] = None):
+        self.chat_id = chat_id
+        self.text = text
+        self.reply_markup = reply_markup
+        self.alert = alert
+        # Если задан — редактируем существующее сообщение вместо отправки нового
+        self.message_id = message_id
+        # (имя файла, содержимое) — отправка файла, text становится подписью
+        self.document = document
+        self.attempts = 0
+        self.callbacks = callbacks or []
+
+    def finish(self, ok: bool, detail: str = ""):
+        """Сообщить итог доставки подписчикам"""
+        for callback in self.callbacks:
+            try:
+                callback(ok, detail)
+            except Exception as e:
+                logger.error(f"Ошибка обработки итога доставки: {e}")
+
+
+class _AlertBuffer:
+    __slots__ = ("last_sent", "pending", "reply_markup", "callbacks")
+
+    def __init__(self):
+        self.last_sent = float("-inf")
+        self.pending: List[str] = []
+        self.reply_markup: Optional[str] = None
+        self.callbacks: List[DeliveryCallback] = []
+
+
+class OutboundQueue:
+    """Ограниченная очередь отправки с пулом потоков-доставщиков
+
+    Медленный или заблокированный чат занимает один поток и не задерживает остальные.
+    """
+
+    def __init__(self, session: requests.Session, api_url: str, maxsize: int = 100,
+                 coalesce_window: float = 10.0, max_attempts: int = 5, workers: int = 4):
+        self.session = session
+        self.api_url = api_url
+        self.maxsize = maxsize
+        self.coalesce_window = coalesce_window
+        self.max_attempts = max_attempts
+        self.dropped = 0
+        self._queue: Deque[_Message] = deque()
+        self._cond = threading.Condition()
+        self._global = TokenBucket(GLOBAL_RATE, GLOBAL_RATE)
+        self._chats: Dict[int, TokenBucket] = {}
+        self._blocked_until: Dict[int, float] = {}
+        self._global_blocked_until = 0.0
+        self._alerts: Dict[int, _AlertBuffer] = {}
+        # Чаты, сообщение в которые сейчас отправляется
+        self._in_flight: set = set()
+        self.workers = max(1, workers)
+        self._stopped = False
+        self._threads: List[threading.Thread] = []
+
+    def start(self):
+        """Запустить потоки доставки"""
+        if any(thread.is_alive() for thread in self._threads):
+            return
+        self._stopped = False
+        self._threads = [threading.Thread(target=self._loop, daemon=True) for _ in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Остановить доставку, дав очереди время опустеть"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(deadline - time.monotonic(), 0))
+
+    def depth(self) -> int:
+        with self._cond:
+            return len(self._queue)
+
+    def put(self, chat_id: int, text: str, reply_markup: Optional[str] = None,
+            message_id: Optional[int] = None) -> bool:
+        """Поставить сообщение (или правку сообщения message_id) в очередь
+
+        Возвращает False, если сообщение отброшено из-за переполнения.
+        """
+        with self._cond:
+            accepted = self._enqueue(_Message(chat_id, text, reply_markup, alert=False, message_id=message_id))
+            self._cond.notify_all()
+        return accepted
+
+    def put_document(self, chat_id: int, filename: str, content: bytes, caption: str = "") -> bool:
+        """Поставить в очередь отправку файла"""
+        with self._cond:
+            accepted = self._enqueue(_Message(chat_id, caption, None, alert=False, document=(filename, content)))
+            self._cond.notify_all()
+        return accepted
+
+    def put_alert(self, chat_id: int, text: str, reply_markup: Optional[str] = None,
+                  on_result: Optional[DeliveryCallback] = None) -> bool:
+        """Алерт уходит сразу, следующие в пределах окна склеиваются в одну сводку
+
+        on_result вызывается с итогом доставки (для сводки — итогом сводки).
+        """
+        callbacks = [on_result] if on_result else []
+        with self._cond:
+            now = time.monotonic()
+            buffer = self._alerts.setdefault(chat_id, _AlertBuffer())
+            if not buffer.pending and now - buffer.last_sent >= self.coalesce_window:
+                buffer.last_sent = now
+                accepted = self._enqueue(_Message(chat_id, text, reply_markup, alert=True, callbacks=callbacks))
+            else:
+                buffer.pending.append(text)
+                buffer.reply_markup = reply_markup
+                buffer.callbacks.extend(callbacks)
+                accepted = True
+            self._cond.notify_all()
+        return accepted
+
+    def _enqueue(self, message: _Message) -> bool:
+        if len(self._queue) >= self.maxsize:
+            # Переполнение: сначала вытесняем самое старое обычное сообщение,
+            # алерты уступают место только другим алертам
+            victim = next((m for m in self._queue if not m.alert), None)
+            if victim is None and not message.alert:
+                self.dropped += 1
+                logger.error(f"Очередь отправки переполнена, сообщение в чат {message.chat_id} отброшено")
+                message.finish(False, "очередь переполнена")
+                return False
+            victim = victim or self._queue[0]
+            self._queue.remove(victim)
+            self.dropped += 1
+            logger.error(f"Очередь отправки переполнена, вытеснено сообщение в чат {victim.chat_id}")
+            victim.finish(False, "вытеснено из переполненной очереди")
+        self._queue.append(message)
+        return True
+
+    @staticmethod
+    def _digest(texts: List[str]) -> str:
+        if len(texts) == 1:
+            return texts[0]
+        header = f"📦 *Сводка алертов ({len(texts)})*\n\n"
+        separator = "\n\n➖➖➖\n\n"
+        # Новые события важнее: если не влезает, отбрасываем самые старые
+        kept: List[str] = []
+        size = len(header) + 32
+        for text in reversed(texts):
+            size += len(text) + len(separator)
+            if size > MAX_TEXT and kept:
+                break
+            kept.append(text[:MAX_TEXT - len(header) - 32])
+        kept.reverse()
+        skipped = len(texts) - len(kept)
+        prefix = f"…и еще {skipped} ранее\n\n" if skipped else ""
+        return header + prefix + separator.join(kept)
+
+    def _flush_alerts(self, now: float, force: bool = False) -> Optional[float]:
+        """Отправить созревшие сводки; вернуть время до следующей"""
+        wait = None
+        for chat_id, buffer in self._alerts.items():
+            if not buffer.pending:
+                continue
+            due = buffer.last_sent + self.coalesce_window - now
+            if due <= 0 or force:
+                self._enqueue(_Message(chat_id, self._digest(buffer.pending), buffer.reply_markup,
+                                       alert=True, callbacks=buffer.callbacks))
+                buffer.pending = []
+                buffer.callbacks = []
+                buffer.last_sent = now
+            else:
+                wait = due if wait is None else min(wait, due)
+        return wait
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            rate = GROUP_CHAT_RATE if chat_id < 0 else PRIVATE_CHAT_RATE
+            bucket = self._chats[chat_id] = TokenBucket(rate, BURST)
+        return bucket
+
+    def _next_ready(self, now: float) -> Tuple[Optional[_Message], Optional[float]]:
+        """Первое сообщение, которое можно отправить сейчас, или время ожидания"""
+        if not self._queue:
+            return None, None
+        wait = max(self._global_blocked_until - now, self._global.delay(now))
+        if wait > 0:
+            return None, wait
+        wait = None
+        seen = set()
+        for message in self._queue:
+            # Порядок внутри чата сохраняем: смотрим только первое сообщение каждого чата,
+            # и только если в этот чат сейчас ничего не отправляется
+            if message.chat_id in seen:
+                continue
+            seen.add(message.chat_id)
+            if message.chat_id in self._in_flight:
+                continue
+            chat_wait = max(self._blocked_until.get(message.chat_id, 0.0) - now,
+                            self._chat_bucket(message.chat_id).delay(now))
+            if chat_wait <= 0:
+                return message, None
+            wait = chat_wait if wait is None else min(wait, chat_wait)
+        return None, wait
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    alert_wait = self._flush_alerts(now, force=self._stopped)
+                    message, wait = self._next_ready(now)
+                    if message is not None:
+                        self._queue.remove(message)
+                        self._global.consume(now)
+                        self._chat_bucket(message.chat_id).consume(now)
+                        self._in_flight.add(message.chat_id)
+                        break
+                    if self._stopped and not self._queue:
+                        return
+                    if alert_wait is not None:
+                        wait = alert_wait if wait is None else min(wait, alert_wait)
+                    self._cond.wait(wait)
+            try:
+                self._deliver(message)
+            finally:
+                with self._cond:
+                    self._in_flight.discard(message.chat_id)
+                    self._cond.notify_all()
+
+    def _deliver(self, message: _Message):
+        data = {"chat_id": message.chat_id, "text": message.text, "parse_mode": "Markdown"}
+        if message.reply_markup:
+            data["reply_markup"] = message.reply_markup
+        method, files = "sendMessage", None
+        if message.message_id is not None:
+            method = "editMessageText"
+            data["message_id"] = message.message_id
+        elif message.document is not None:
+            method = "sendDocument"
+            data["caption"] = data.pop("text")
+            files = {"document": message.document}
+        try:
+            with metrics.TELEGRAM_SECONDS.time(method):
+                response = self.session.post(f"{self.api_url}/{method}", data=data, files=files, timeout=10)
+            if response.status_code >= 400:
+                metrics.TELEGRAM_ERRORS.inc(method)
+            if response.status_code == 429:
+                retry_after = self._retry_after(response)
+                self._retry(message, retry_after, chat_only=True)
+                return
+            if response.status_code >= 500:
+                # Сбой на стороне Telegram касается всех чатов — пауза общая
+                self._retry(message, self._backoff(message), chat_only=False)
+                return
+            if response.status_code >= 400:
+                logger.error(f"Ошибка отправки сообщения: {response.status_code} {response.text[:200]}")
+                message.finish(False, f"HTTP {response.status_code}: {self._description(response)}")
+                return
+            message.finish(True)
+        except requests.RequestException as e:
+            metrics.TELEGRAM_ERRORS.inc(method)
+            logger.error(f"Ошибка отправки сообщения: {e}")
+            # Таймаут или обрыв при отправке в один чат не должен держать остальные
+            self._retry(message, self._backoff(message), chat_only=True)
+
+    @staticmethod
+    def _retry_after(response: requests.Response) -> float:
+        try:
+            return float(response.json().get("parameters", {}).get("retry_after", 1))
+        except (ValueError, AttributeError):
+            return 1.0
+
+    @staticmethod
+    def _description(response: requests.Response) -> str:
+        try:
+            return str(response.json().get("description", ""))[:200]
+        except (ValueError, AttributeError):
+            return response.text[:200]
+
+    @staticmethod
+    def _backoff(message: _Message) -> float:
+        return min(2 ** message.attempts, 60)
+
+    def _retry(self, message: _Message, delay: float, chat_only: bool):
+        """Вернуть сообщение в начало очереди с паузой"""
+        message.attempts += 1
+        if message.attempts >= self.max_attempts:
+            with self._cond:
+                self.dropped += 1
+            logger.error(f"Сообщение в чат {message.chat_id} отброшено после {message.attempts} попыток")
+            message.finish(False, f"не доставлено за {message.attempts} попыток")
+            return
+        with self._cond:
+            until = time.monotonic() + delay
+            if chat_only:
+                self._blocked_until[message.chat_id] = until
+            else:
+                self._global_blocked_until = until
+            self._queue.appendleft(message)
+            self._cond.notify_all()
+
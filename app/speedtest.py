@@ -0,0 +1,217 @@
+"""
+Встроенный тест скорости
+Download и upload в несколько параллельных потоков, разгон TCP (slow start)
+не учитывается, весь тест укладывается в жесткий бюджет времени
+"""
+
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional
+
+import requests
+
+CHUNK_SIZE = 64 * 1024
+_UPLOAD_CHUNK = b"\0" * CHUNK_SIZE
+# Сколько ждать ответа сервера на upload после окончания фазы, с
+UPLOAD_ACK_GRACE = 2.0
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Перцентиль с линейной интерполяцией"""
+    ordered = sorted(values)
+    if len(ordered) == 1:
+        return ordered[0]
+    position = (len(ordered) - 1) * pct / 100
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+class _Meter:
+    """Общий счетчик байт всех потоков одной фазы"""
+
+    def __init__(self, streams: int):
+        self.total = 0
+        # Запросов upload, прием которых сервер подтвердил ответом 2xx
+        self.acked = 0
+        self.errors: List[str] = []
+        self.stop = threading.Event()
+        self.done = threading.Event()
+        self._active = streams
+        self._lock = threading.Lock()
+
+    def add(self, count: int):
+        with self._lock:
+            self.total += count
+
+    def ack(self):
+        with self._lock:
+            self.acked += 1
+
+    def error(self, message: str):
+        with self._lock:
+            if message not in self.errors and len(self.errors) < 3:
+                self.errors.append(message)
+
+    def finished(self):
+        """Поток завершился; когда завершились все, ждать фазу до конца незачем"""
+        with self._lock:
+            self._active -= 1
+            if self._active <= 0:
+                self.stop.set()
+                self.done.set()
+
+
+class SpeedTest:
+    """Тест скорости по настраиваемым HTTP-эндпоинтам
+
+    download_url отдает поток байт на GET, upload_url принимает тело POST,
+    latency_url — маленький ответ для замеров задержки.
+    """
+
+    def __init__(self, download_url: str, upload_url: str, latency_url: str,
+                 streams: int = 4, duration: float = 8.0, warmup: float = 1.5,
+                 budget: float = 25.0, latency_samples: int = 10, cache_ttl: float = 60.0):
+        self.download_url = download_url
+        self.upload_url = upload_url
+        self.latency_url = latency_url
+        self.streams = max(1, streams)
+        self.duration = duration
+        self.warmup = warmup
+        self.budget = budget
+        self.latency_samples = latency_samples
+        self.cache_ttl = cache_ttl
+        self._lock = threading.Lock()
+        self._result: Optional[Dict[str, Any]] = None
+        self._result_at = 0.0
+
+    def run(self, force: bool = False) -> Dict[str, Any]:
+        """Результат теста; в пределах cache_ttl — из кэша (поле age — его возраст)"""
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._result is not None and now - self._result_at < self.cache_ttl:
+                return dict(self._result, age=now - self._result_at)
+            result = self.measure()
+            self._result = result
+            self._result_at = time.monotonic()
+            return dict(result, age=0.0)
+
+    def measure(self) -> Dict[str, Any]:
+        """Провести замер: задержка, download, upload"""
+        started = time.monotonic()
+        deadline = started + self.budget
+        result: Dict[str, Any] = {"errors": []}
+        # Бюджет делится между фазами: задержке — не больше десятой части
+        latency_deadline = min(deadline, started + self.budget / 10)
+        result.update(self._measure_latency(latency_deadline, result["errors"]))
+        for phase in ("download", "upload"):
+            remaining = deadline - time.monotonic()
+            if phase == "download":
+                # Оставляем upload не меньше половины остатка
+                remaining /= 2
+            phase_time = min(self.duration, remaining)
+            if phase_time <= self.warmup:
+                result[f"{phase}_mbps"] = None
+                result["errors"].append(f"{phase}: не хватило времени")
+                continue
+            mbps, errors = self._measure_throughput(phase, phase_time)
+            result[f"{phase}_mbps"] = mbps
+            result["errors"].extend(f"{phase}: {e}" for e in errors)
+        result["duration"] = time.monotonic() - started
+        return result
+
+    def _measure_latency(self, deadline: float, errors: List[str]) -> Dict[str, Any]:
+        """Последовательные запросы по одному keep-alive соединению; первый (с установкой
+        соединения) отбрасывается"""
+        samples: List[float] = []
+        with requests.Session() as session:
+            for attempt in range(self.latency_samples + 1):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    t0 = time.perf_counter()
+                    response = session.get(self.latency_url, timeout=remaining)
+                    response.content
+                    elapsed = (time.perf_counter() - t0) * 1000
+                except requests.RequestException as e:
+                    errors.append(f"ping: {e}")
+                    break
+                if attempt > 0:
+                    samples.append(elapsed)
+        if not samples:
+            return {"ping_ms": None, "ping_p90_ms": None, "jitter_ms": None}
+        # Джиттер — средняя разница соседних замеров
+        jitter = statistics.mean(abs(a - b) for a, b in zip(samples, samples[1:])) if len(samples) > 1 else 0.0
+        return {
+            "ping_ms": percentile(samples, 50),
+            "ping_p90_ms": percentile(samples, 90),
+            "jitter_ms": jitter,
+        }
+
+    def _measure_throughput(self, phase: str, phase_time: float):
+        """Скорость фазы в Мбит/с по байтам, переданным после разгона"""
+        meter = _Meter(self.streams)
+        worker = self._download_stream if phase == "download" else self._upload_stream
+        executor = ThreadPoolExecutor(max_workers=self.streams, thread_name_prefix=f"speed-{phase}")
+        try:
+            for _ in range(self.streams):
+                executor.submit(self._stream, worker, meter, phase_time)
+            meter.stop.wait(self.warmup)
+            bytes0, t0 = meter.total, time.monotonic()
+            meter.stop.wait(phase_time - self.warmup)
+            bytes1, t1 = meter.total, time.monotonic()
+        finally:
+            meter.stop.set()
+            # Не ждем потоков: зависший запрос не должен выводить тест за бюджет
+            executor.shutdown(wait=False, cancel_futures=True)
+        if phase == "upload":
+            # Отправленные байты ничего не значат, пока сервер не ответил на запрос:
+            # после остановки тело заканчивается, и ответ приходит почти сразу
+            meter.done.wait(UPLOAD_ACK_GRACE)
+            if not meter.acked:
+                return None, meter.errors or ["сервер не подтвердил прием данных"]
+        if bytes1 == bytes0 and meter.errors:
+            return None, meter.errors
+        return (bytes1 - bytes0) * 8 / 1_000_000 / max(t1 - t0, 0.001), meter.errors
+
+    @staticmethod
+    def _stream(worker, meter: _Meter, phase_time: float):
+        try:
+            worker(meter, phase_time)
+        finally:
+            meter.finished()
+
+    def _download_stream(self, meter: _Meter, phase_time: float):
+        with requests.Session() as session:
+            while not meter.stop.is_set():
+                try:
+                    with session.get(self.download_url, stream=True, timeout=phase_time) as response:
+                        response.raise_for_status()
+                        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                            meter.add(len(chunk))
+                            if meter.stop.is_set():
+                                return
+                except requests.RequestException as e:
+                    if not meter.stop.is_set():
+                        meter.error(str(e))
+                    return
+
+    def _upload_stream(self, meter: _Meter, phase_time: float):
+        def body() -> Iterator[bytes]:
+            while not meter.stop.is_set():
+                yield _UPLOAD_CHUNK
+                # Генератор продолжается, только когда предыдущий кусок ушел в сокет
+                meter.add(CHUNK_SIZE)
+
+        with requests.Session() as session:
+            while not meter.stop.is_set():
+                try:
+                    session.post(self.upload_url, data=body(), timeout=phase_time).raise_for_status()
+                    meter.ack()
+                except requests.RequestException as e:
+                    if not meter.stop.is_set():
+                        meter.error(str(e))
+                    return
@@ -0,0 +1,101 @@
+"""
+Постоянное состояние бота (offset обновлений, мониторинг, здоровье целей)
+JSON-файл пишется атомарно (временный файл + fsync + rename), изменения
+копятся в памяти и сбрасываются на диск пачкой раз в flush_interval
+"""
+
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StateStore:
+    """Небольшое хранилище ключ-значение; без path работает только в памяти"""
+
+    def __init__(self, path: Optional[str], flush_interval: float = 5.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._data: Dict[str, Any] = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.load()
+
+    def load(self):
+        """Прочитать состояние; поврежденный файл не мешает запуску"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Не удалось прочитать состояние {self.path}: {e}")
+            return
+        if isinstance(data, dict):
+            with self._lock:
+                self._data = data
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            return self._data.get(key, default)
+
+    def set(self, key: str, value: Any):
+        """Изменить значение; на диск попадет при следующем сбросе"""
+        with self._lock:
+            if self._data.get(key) != value:
+                self._data[key] = value
+                self._dirty = True
+
+    def flush(self):
+        """Записать изменения, если они есть"""
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            payload = json.dumps(self._data, ensure_ascii=False)
+            self._dirty = False
+        try:
+            self._write(payload)
+        except OSError as e:
+            logger.error(f"Не удалось сохранить состояние {self.path}: {e}")
+            with self._lock:
+                self._dirty = True
+
+    def _write(self, payload: str):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        # rename атомарен: после сбоя на диске либо старое, либо новое состояние
+        os.replace(tmp_path, self.path)
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+    def start(self):
+        """Запустить периодический сброс"""
+        if not self.path or (self._thread and self._thread.is_alive()):
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Остановить сброс и записать последние изменения"""
+        self._stopped.set()
+        self.flush()
+
+    def _loop(self):
+        while not self._stopped.wait(self.flush_interval):
+            self.flush()
@@ -0,0 +1,126 @@
+"""
+Реестр подписчиков: роли, подписки на типы алертов и итоги доставки
+Роль определяет доступные команды, подписки — какие алерты получает чат
+"""
+
+import json
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+# Типы алертов и их подписи
+ALERT_TYPES = {
+    "down": "Недоступность",
+    "recovery": "Восстановление",
+    "resources": "Ресурсы контейнера",
+    "logs": "Ошибки в логах",
+}
+
+# admin — все команды; oncall — без управления клиентами wg-easy; viewer — только просмотр
+ROLES = ("admin", "oncall", "viewer")
+DEFAULT_ALERTS = {
+    "admin": set(ALERT_TYPES),
+    "oncall": set(ALERT_TYPES),
+    "viewer": {"down", "recovery"},
+}
+# Команды и действия кнопок, доступные ролям ниже admin
+ONCALL_ACTIONS = {
+    "/start", "start", "/status", "/speed", "/restart", "/monitoring", "/peers", "/top",
+    "/history", "/logs", "/alerts", "status", "status_refresh", "speed", "restart",
+    "restart_confirm", "cancel", "monitoring", "peers", "history", "target", "alerts",
+}
+VIEWER_ACTIONS = {
+    "/start", "start", "/status", "/peers", "/top", "/history", "/logs", "/alerts",
+    "status", "status_refresh", "peers", "history", "target", "alerts",
+}
+
+
+class Subscriber:
+    """Чат (личный или группа) с ролью и подписками"""
+
+    def __init__(self, chat_id: int, role: str = "viewer", name: str = "",
+                 alerts: Optional[Iterable[str]] = None):
+        if role not in ROLES:
+            raise ValueError(f"Подписчик {chat_id}: неизвестная роль {role}")
+        self.chat_id = chat_id
+        self.role = role
+        self.name = name or str(chat_id)
+        self.alerts = set(DEFAULT_ALERTS[role] if alerts is None else alerts) & set(ALERT_TYPES)
+        # Итоги доставки алертов
+        self.delivered = 0
+        self.failed = 0
+        self.last_result: Optional[tuple] = None
+
+    def can(self, action: str) -> bool:
+        if self.role == "admin":
+            return True
+        allowed = ONCALL_ACTIONS if self.role == "oncall" else VIEWER_ACTIONS
+        return action in allowed
+
+
+def load_subscribers(path: Optional[str], admin_id: int) -> List[Subscriber]:
+    """Подписчики из JSON-файла; ADMIN_ID всегда администратор
+
+    Формат: [{"chat_id": -100123, "role": "oncall", "name": "Дежурные", "alerts": ["down"]}].
+    """
+    subscribers = [Subscriber(admin_id, "admin", "ADMIN_ID")]
+    if not path:
+        return subscribers
+    with open(path) as f:
+        for item in json.load(f):
+            chat_id = int(item["chat_id"])
+            if chat_id == admin_id:
+                continue
+            subscribers.append(Subscriber(chat_id, item.get("role", "viewer"), item.get("name", ""),
+                                          item.get("alerts")))
+    return subscribers
+
+
+class SubscriberRegistry:
+    """Поиск подписчиков по чату и типу алерта, итоги доставки"""
+
+    def __init__(self, subscribers: List[Subscriber]):
+        self._subscribers = {s.chat_id: s for s in subscribers}
+        self._lock = threading.Lock()
+
+    def get(self, chat_id: int) -> Optional[Subscriber]:
+        return self._subscribers.get(chat_id)
+
+    def all(self) -> List[Subscriber]:
+        return list(self._subscribers.values())
+
+    def recipients(self, alert_type: str) -> List[Subscriber]:
+        """Подписчики, получающие алерты этого типа"""
+        with self._lock:
+            return [s for s in self._subscribers.values() if alert_type in s.alerts]
+
+    def toggle(self, chat_id: int, alert_type: str) -> bool:
+        """Переключить подписку; вернуть новое состояние"""
+        with self._lock:
+            subscriber = self._subscribers[chat_id]
+            subscriber.alerts ^= {alert_type}
+            return alert_type in subscriber.alerts
+
+    def subscriptions(self) -> Dict[str, List[str]]:
+        """Подписки всех чатов для сохранения между перезапусками"""
+        with self._lock:
+            return {str(s.chat_id): sorted(s.alerts) for s in self._subscribers.values()}
+
+    def restore(self, saved: Dict[str, Any]):
+        with self._lock:
+            for chat_id, alerts in saved.items():
+                subscriber = self._subscribers.get(int(chat_id))
+                if subscriber is not None:
+                    subscriber.alerts = set(alerts) & set(ALERT_TYPES)
+
+    def record(self, chat_id: int, ok: bool, detail: str = ""):
+        """Учесть итог доставки алерта одному получателю"""
+        now = time.time()
+        with self._lock:
+            subscriber = self._subscribers.get(chat_id)
+            if subscriber is not None:
+                if ok:
+                    subscriber.delivered += 1
+                else:
+                    subscriber.failed += 1
+                subscriber.last_result = (now, ok, detail)
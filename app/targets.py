@@ -0,0 +1,268 @@
+"""
+Реестр целей мониторинга и планировщик проверок
+Каждая цель проверяется со своим интервалом и таймаутом, проверки идут параллельно.
+Пока цель стабильна, интервал растет (с разбросом), после сбоя — быстрые перепроверки;
+смена состояния подтверждается N из M последних проверок
+"""
+
+import heapq
+import itertools
+import json
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Рост интервала за каждую успешную проверку и разброс сроков (доля интервала)
+BACKOFF_FACTOR = 1.5
+JITTER = 0.1
+
+
+class Hysteresis:
+    """Подтвержденное состояние: меняется, когда threshold из последних window
+    проверок с ним не согласны"""
+
+    def __init__(self, threshold: int = 2, window: int = 3):
+        self.window = max(1, window)
+        self.threshold = max(1, min(threshold, self.window))
+        self.state: Optional[bool] = None
+        self._results: deque = deque(maxlen=self.window)
+
+    def observe(self, ok: bool) -> Optional[bool]:
+        self._results.append(ok)
+        previous = self.state
+        if self.state is None and ok:
+            # При старте рабочая цель подтверждается сразу, алерта тут не бывает
+            self.state = True
+        elif self.state is not False and self.failures() >= self.threshold:
+            self.state = False
+        elif self.state is False and len(self._results) - self.failures() >= self.threshold:
+            self.state = True
+        if self.state != previous:
+            # Следующая смена требует threshold новых результатов, а не старых из окна
+            self._results.clear()
+        return self.state
+
+    def failures(self) -> int:
+        return sum(1 for ok in self._results if not ok)
+
+    def reset(self, state: bool):
+        """Принять состояние из надежного источника (событие Docker)"""
+        self.state = state
+        self._results.clear()
+
+
+class Target:
+    """Цель мониторинга: контейнер wg-easy и/или адрес веб-интерфейса"""
+
+    def __init__(self, name: str, container: Optional[str] = None, url: Optional[str] = None,
+                 interval: float = 10, timeout: float = 3, check_url: Optional[bool] = None,
+                 fast_interval: float = 2, max_interval: float = 60, threshold: int = 2, window: int = 3):
+        if not container and not url:
+            raise ValueError(f"Цель {name}: нужен container или url")
+        self.name = name
+        self.container = container
+        self.url = url
+        self.interval = interval
+        self.timeout = timeout
+        # Без контейнера проверять больше нечего, кроме веб-интерфейса
+        self.check_url = bool(url) and (check_url if check_url is not None else not container)
+        # Последний результат проверки
+        self.last_ok: Optional[bool] = None
+        self.last_message = ""
+        self.last_checked: Optional[float] = None
+        self.last_latency: Optional[float] = None
+        # Адаптивный интервал и подтверждение смены состояния
+        self.fast_interval = fast_interval
+        self.max_interval = max_interval
+        self.current_interval = interval
+        self.health = Hysteresis(threshold, window)
+        self.last_probe_ok: Optional[bool] = None
+        # Статистика: число проверок и время обнаружения сбоя
+        # (от последней успешной проверки до подтверждения)
+        self.probes = 0
+        self.last_success_at: Optional[float] = None
+        self.last_detection: Optional[float] = None
+        self.detections = 0
+        self.detection_total = 0.0
+
+    def observe(self, ok: bool, now: float) -> Optional[bool]:
+        """Учесть результат проверки; вернуть подтвержденное состояние"""
+        self.probes += 1
+        self.last_probe_ok = ok
+        previous = self.health.state
+        state = self.health.observe(ok)
+        if previous is not False and state is False and self.last_success_at is not None:
+            self.last_detection = now - self.last_success_at
+            self.detections += 1
+            self.detection_total += self.last_detection
+        if ok:
+            self.last_success_at = now
+        return state
+
+    def next_delay(self) -> float:
+        """Пауза до следующей проверки"""
+        state = self.health.state
+        if self.last_probe_ok is not None and self.last_probe_ok != state:
+            # Смена состояния еще не подтверждена — быстрая перепроверка
+            self.current_interval = self.interval
+            return self.fast_interval
+        if state is False or self.health.failures():
+            self.current_interval = self.interval
+            return self.interval
+        # Цель стабильна: реже проверяем, разброс не дает проверкам разных целей совпадать
+        limit = max(self.max_interval, self.interval)
+        self.current_interval = min(max(self.current_interval, self.interval) * BACKOFF_FACTOR, limit)
+        return self.current_interval * random.uniform(1 - JITTER, 1 + JITTER)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], defaults: Dict[str, Any]) -> "Target":
+        options = dict(defaults)
+        options.update(data)
+        return cls(
+            name=str(options["name"]),
+            container=options.get("container"),
+            url=options.get("url"),
+            interval=float(options.get("interval", 10)),
+            timeout=float(options.get("timeout", 3)),
+            check_url=options.get("check_url"),
+            fast_interval=float(options.get("fast_interval", 2)),
+            max_interval=float(options.get("max_interval", 60)),
+            threshold=int(options.get("threshold", 2)),
+            window=int(options.get("window", 3)),
+        )
+
+
+def load_targets(path: Optional[str], default: Target) -> List[Target]:
+    """Загрузить цели из JSON-файла; без файла — одна цель из переменных окружения
+
+    Формат: список целей или {"defaults": {...}, "targets": [...]}.
+    """
+    if not path:
+        return [default]
+    with open(path) as f:
+        config = json.load(f)
+    if isinstance(config, list):
+        config = {"targets": config}
+    defaults = {
+        "interval": default.interval,
+        "timeout": default.timeout,
+        "fast_interval": default.fast_interval,
+        "max_interval": default.max_interval,
+        "threshold": default.health.threshold,
+        "window": default.health.window,
+    }
+    defaults.update(config.get("defaults", {}))
+    targets = [Target.from_dict(item, defaults) for item in config.get("targets", [])]
+    if not targets:
+        raise ValueError(f"{path}: не задано ни одной цели")
+    names = [t.name for t in targets]
+    if len(set(names)) != len(names):
+        raise ValueError(f"{path}: имена целей должны быть уникальны")
+    return targets
+
+
+class ProbeScheduler:
+    """Планировщик проверок на куче сроков; проверки выполняются в пуле потоков"""
+
+    def __init__(self, targets: List[Target], probe: Callable[[Target], Tuple[bool, str]],
+                 on_result: Callable[[Target, bool, str], None], max_workers: int = 4):
+        self.targets = {t.name: t for t in targets}
+        self._probe = probe
+        self._on_result = on_result
+        self._executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(targets))),
+                                            thread_name_prefix="probe")
+        # (срок, порядковый номер, имя цели)
+        self._heap: List[Tuple[float, int, str]] = []
+        self._seq = itertools.count()
+        self._in_flight = set()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self.paused = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Запустить планировщик; первая проверка всех целей — сразу"""
+        if self._thread and self._thread.is_alive():
+            return
+        with self._cond:
+            self._stopped = False
+            self._heap = []
+            now = time.monotonic()
+            for name in self.targets:
+                heapq.heappush(self._heap, (now, next(self._seq), name))
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def set_paused(self, paused: bool):
+        with self._cond:
+            self.paused = paused
+            self._cond.notify()
+
+    def trigger(self, name: str):
+        """Проверить цель вне очереди"""
+        with self._cond:
+            if name in self.targets and name not in self._in_flight:
+                heapq.heappush(self._heap, (time.monotonic(), next(self._seq), name))
+                self._cond.notify()
+
+    def by_container(self, container: str) -> Optional[Target]:
+        for target in self.targets.values():
+            if target.container == container:
+                return target
+        return None
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopped:
+                        return
+                    now = time.monotonic()
+                    if not self.paused and self._heap and self._heap[0][0] <= now:
+                        due, _, name = heapq.heappop(self._heap)
+                        # Устаревшие дубликаты (после trigger) пропускаем
+                        if name in self._in_flight:
+                            continue
+                        self._in_flight.add(name)
+                        metrics.MONITOR_LAG.set(now - due, name)
+                        break
+                    wait = None if self.paused or not self._heap else self._heap[0][0] - now
+                    self._cond.wait(wait)
+            self._executor.submit(self._run, self.targets[name])
+
+    def _run(self, target: Target):
+        started = time.monotonic()
+        try:
+            ok, message = self._probe(target)
+        except Exception as e:
+            logger.error(f"Ошибка проверки {target.name}: {e}")
+            ok, message = False, f"Ошибка проверки: {str(e)}"
+        finished = time.monotonic()
+        target.last_latency = finished - started
+        target.last_checked = time.time()
+        target.observe(ok, finished)
+        try:
+            self._on_result(target, ok, message)
+        except Exception as e:
+            logger.error(f"Ошибка обработки результата {target.name}: {e}")
+        with self._cond:
+            self._in_flight.discard(target.name)
+            # Убираем запланированные дубликаты: следующий срок считается от этой проверки
+            self._heap = [item for item in self._heap if item[2] != target.name]
+            heapq.heapify(self._heap)
+            heapq.heappush(self._heap, (finished + target.next_delay(), next(self._seq), target.name))
+            self._cond.notify()
@@ -0,0 +1,119 @@
+"""
+Встроенный HTTP-сервер для приема обновлений Telegram через webhook
+Работает на asyncio без внешних зависимостей
+"""
+
+import asyncio
+import hmac
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+MAX_BODY = 1024 * 1024
+
+_REASONS = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found",
+            405: "Method Not Allowed", 413: "Payload Too Large"}
+
+
+class WebhookServer:
+    """Принимает POST от Telegram, проверяет секрет и передает обновления обработчику"""
+
+    def __init__(self, host: str, port: int, path: str, secret: str,
+                 handler: Callable[[Dict[str, Any]], None]):
+        self.host = host
+        self.port = port
+        self.path = path
+        self.secret = secret
+        self.handler = handler
+        # Один поток сохраняет порядок обработки обновлений
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="webhook")
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    def serve_forever(self):
+        """Запустить сервер в текущем потоке до вызова stop()"""
+        asyncio.run(self._serve())
+
+    def stop(self):
+        if self._loop and self._server:
+            self._loop.call_soon_threadsafe(self._server.close)
+
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        print(f"Webhook-сервер слушает {self.host}:{self.port}{self.path}")
+        try:
+            await self._server.wait_closed()
+        finally:
+            self._executor.shutdown(wait=False)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            # Telegram держит keep-alive, поэтому обрабатываем запросы в цикле
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, _, rest = request_line.decode("latin-1").partition(" ")
+                target = rest.split(" ", 1)[0]
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", "0") or 0)
+                if length > MAX_BODY:
+                    await self._respond(writer, 413, close=True)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                status = self._check_request(method, target, headers)
+                update = None
+                if status == 200:
+                    try:
+                        update = json.loads(body)
+                    except ValueError:
+                        status = 400
+                keep_alive = headers.get("connection", "").lower() != "close"
+                # Отвечаем сразу, обработка идет в отдельном потоке
+                await self._respond(writer, status, close=not keep_alive)
+                if update is not None:
+                    self._loop.run_in_executor(self._executor, self._dispatch, update)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def _check_request(self, method: str, target: str, headers: Dict[str, str]) -> int:
+        if target.split("?", 1)[0] != self.path:
+            return 404
+        if method != "POST":
+            return 405
+        if not hmac.compare_digest(headers.get(SECRET_HEADER, ""), self.secret):
+            logger.error("Webhook: запрос с неверным секретом отклонен")
+            return 401
+        return 200
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: int, close: bool = False):
+        connection = "close" if close else "keep-alive"
+        writer.write(
+            f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+            f"Content-Length: 0\r\nConnection: {connection}\r\n\r\n".encode()
+        )
+        await writer.drain()
+
+    def _dispatch(self, update: Dict[str, Any]):
+        try:
+            self.handler(update)
+        except Exception as e:
+            logger.error(f"Ошибка обработки webhook-обновления: {e}")
@@ -0,0 +1,129 @@
+"""
+Клиент HTTP API wg-easy
+Пул keep-alive соединений, кэш сессии входа и кэш списка клиентов (ETag/TTL)
+"""
+
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from urllib.parse import quote
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class WGEasyAPIError(Exception):
+    """Ошибка обращения к API wg-easy"""
+
+    def __init__(self, message: str, status: int = 0):
+        super().__init__(message)
+        self.status = status
+
+
+class WGEasyAPI:
+    """Управление клиентами wg-easy через его REST API"""
+
+    def __init__(self, base_url: str, password: str = "", timeout: float = 5.0, cache_ttl: float = 15.0):
+        self.base_url = base_url.rstrip("/")
+        self.password = password
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+        self.session = requests.Session()
+        # Небольшой пул: бот делает мало параллельных запросов, но держит соединения открытыми
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._logged_in = False
+        self._login_lock = threading.Lock()
+        self._cache_lock = threading.Lock()
+        self._clients: Optional[List[Dict[str, Any]]] = None
+        self._clients_etag: Optional[str] = None
+        self._clients_at = 0.0
+
+    def _login(self):
+        """Получить cookie сессии; без пароля wg-easy вход не требует"""
+        with self._login_lock:
+            if self._logged_in:
+                return
+            if self.password:
+                response = self.session.post(f"{self.base_url}/api/session",
+                                             json={"password": self.password}, timeout=self.timeout)
+                if response.status_code >= 400:
+                    raise WGEasyAPIError(f"Вход в wg-easy не удался: HTTP {response.status_code}",
+                                         response.status_code)
+            self._logged_in = True
+
+    def _request(self, method: str, path: str, headers: Optional[Dict[str, str]] = None,
+                 **kwargs) -> requests.Response:
+        """Запрос с автоматическим повторным входом при истекшей сессии"""
+        url = f"{self.base_url}{path}"
+        try:
+            self._login()
+            response = self.session.request(method, url, headers=headers, timeout=self.timeout, **kwargs)
+            if response.status_code == 401:
+                self._logged_in = False
+                self._login()
+                response = self.session.request(method, url, headers=headers, timeout=self.timeout, **kwargs)
+        except requests.RequestException as e:
+            raise WGEasyAPIError(f"wg-easy недоступен: {e}") from e
+        if response.status_code >= 400:
+            raise WGEasyAPIError(f"wg-easy: HTTP {response.status_code} {response.text[:200]}",
+                                 response.status_code)
+        return response
+
+    @staticmethod
+    def _json(response: requests.Response) -> Any:
+        try:
+            return response.json()
+        except ValueError as e:
+            raise WGEasyAPIError(f"wg-easy: некорректный ответ: {e}") from e
+
+    def invalidate(self):
+        """Сбросить кэш списка клиентов"""
+        with self._cache_lock:
+            self._clients_at = 0.0
+
+    def list_clients(self, force: bool = False) -> List[Dict[str, Any]]:
+        """Список клиентов; в пределах TTL — из кэша, дальше — условный запрос по ETag"""
+        with self._cache_lock:
+            if not force and self._clients is not None and time.monotonic() - self._clients_at < self.cache_ttl:
+                return self._clients
+            etag = self._clients_etag if self._clients is not None else None
+        headers = {"If-None-Match": etag} if etag else None
+        response = self._request("GET", "/api/wireguard/client", headers=headers)
+        with self._cache_lock:
+            if response.status_code != 304:
+                clients = self._json(response)
+                if not isinstance(clients, list):
+                    raise WGEasyAPIError("wg-easy: список клиентов в неожиданном формате")
+                self._clients = clients
+                self._clients_etag = response.headers.get("ETag")
+            self._clients_at = time.monotonic()
+            return self._clients
+
+    def get_client(self, client_id: str) -> Optional[Dict[str, Any]]:
+        for client in self.list_clients():
+            if client.get("id") == client_id:
+                return client
+        return None
+
+    def create_client(self, name: str):
+        self._request("POST", "/api/wireguard/client", json={"name": name})
+        self.invalidate()
+
+    def delete_client(self, client_id: str):
+        self._request("DELETE", f"/api/wireguard/client/{quote(client_id)}")
+        self.invalidate()
+
+    def set_enabled(self, client_id: str, enabled: bool):
+        action = "enable" if enabled else "disable"
+        self._request("POST", f"/api/wireguard/client/{quote(client_id)}/{action}")
+        self.invalidate()
+
+    def get_config(self, client_id: str) -> bytes:
+        """Конфигурация клиента (.conf)"""
+        return self._request("GET", f"/api/wireguard/client/{quote(client_id)}/configuration").content
+
+    def get_qrcode(self, client_id: str) -> bytes:
+        """QR-код конфигурации в SVG"""
+        return self._request("GET", f"/api/wireguard/client/{quote(client_id)}/qrcode.svg").content
@@ -0,0 +1 @@
+# Бенчмарк бота с локальными заглушками Telegram и Docker
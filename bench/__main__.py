@@ -0,0 +1,62 @@
+"""
+Запуск бенчмарка: python -m bench [параметры] > result.json
+Результат — JSON в stdout (или в --output), ход прогона — в stderr
+"""
+
+import argparse
+import json
+import sys
+
+from .runner import DEFAULT_MIX, Benchmark
+
+
+def _floats(value: str):
+    return [float(item) for item in value.split(",") if item]
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Бенчмарк wg-easy-tg с заглушками API")
+    parser.add_argument("--rates", type=_floats, default=[5.0, 20.0, 50.0],
+                        help="частоты обновлений в секунду через запятую (по фазе на каждую)")
+    parser.add_argument("--duration", type=float, default=20, help="длительность фазы нагрузки, с")
+    parser.add_argument("--idle", type=float, default=15, help="фаза простоя для стоимости проверок, с")
+    parser.add_argument("--drain", type=float, default=15, help="ожидание ответов после фазы, с")
+    parser.add_argument("--chats", type=int, default=50, help="число чатов, по которым идут обновления")
+    parser.add_argument("--mix", default=",".join(DEFAULT_MIX),
+                        help="команды и кнопки (cb:<data>) через запятую")
+    parser.add_argument("--probe-interval", type=int, default=2, help="MONITOR_INTERVAL бота, с")
+    parser.add_argument("--peers", type=int, default=50, help="пиров в выводе wg show")
+    parser.add_argument("--docker-latency", type=float, default=0.0, help="задержка Docker API, мс")
+    parser.add_argument("--telegram-latency", type=float, default=0.0, help="задержка Bot API, мс")
+    parser.add_argument("--log-rate", type=float, default=5.0, help="строк лога контейнера в секунду")
+    parser.add_argument("--no-log-watch", action="store_true", help="запустить бота с LOG_WATCH=false")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="дополнительная переменная окружения бота (можно повторять)")
+    parser.add_argument("--output", help="файл для JSON вместо stdout")
+    args = parser.parse_args()
+
+    benchmark = Benchmark(
+        args.rates, duration=args.duration, idle=args.idle, drain=args.drain, chats=args.chats,
+        mix=tuple(item for item in args.mix.split(",") if item), probe_interval=args.probe_interval,
+        peers=args.peers, docker_latency=args.docker_latency / 1000,
+        telegram_latency=args.telegram_latency / 1000, log_rate=args.log_rate,
+        log_watch=not args.no_log_watch, seed=args.seed,
+        env=dict(item.split("=", 1) for item in args.env),
+    )
+    print(f"Бенчмарк: простой {args.idle:g} с, фазы {args.rates} по {args.duration:g} с", file=sys.stderr)
+    result = benchmark.run()
+    for phase in result["phases"]:
+        latency = phase["latency_ms"]
+        print(f"  {phase['rate']:g}/с: ответов {phase['replied']}/{phase['sent']}, "
+              f"p50 {latency['p50']} мс, p99 {latency['p99']} мс, CPU {phase['cpu_percent']}%", file=sys.stderr)
+    payload = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(payload + "\n")
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
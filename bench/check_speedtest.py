@@ -0,0 +1,110 @@
+"""
+Проверка теста скорости на заглушке: python -m bench.check_speedtest
+Правдоподобные задержка, джиттер и скорость на канале с известными параметрами,
+кэш результата в пределах TTL, соблюдение бюджета времени при зависшем сервере
+"""
+
+import sys
+import time
+from typing import Callable, List, Tuple
+
+from app.speedtest import UPLOAD_ACK_GRACE, SpeedTest
+
+from .fakes import FakeSpeedServer
+
+LATENCY = 0.02
+RATE_MBPS = 40.0
+# Допустимое отклонение измеренной скорости от пропускной способности заглушки
+RATE_TOLERANCE = 0.3
+
+
+def _expect(checks: List[Tuple[str, bool]], name: str, condition: bool):
+    checks.append((name, condition))
+
+
+def _speedtest(fake: FakeSpeedServer, **kwargs) -> SpeedTest:
+    options = dict(streams=2, duration=4.0, warmup=1.0, budget=15.0, latency_samples=10)
+    options.update(kwargs)
+    return SpeedTest(f"{fake.url}/__down?bytes=50000000", f"{fake.url}/__up",
+                     f"{fake.url}/__down?bytes=0", **options)
+
+
+def _plausible(mbps, rate: float) -> bool:
+    return mbps is not None and abs(mbps - rate) <= rate * RATE_TOLERANCE
+
+
+def scenario_measure(fake: FakeSpeedServer, checks: List[Tuple[str, bool]]):
+    fake.latency, fake.rate_mbps = LATENCY, RATE_MBPS
+    result = _speedtest(fake).measure()
+    ping = result["ping_ms"]
+    _expect(checks, f"пинг {ping or 0:.1f} мс около {LATENCY * 1000:.0f} мс",
+            ping is not None and LATENCY * 1000 <= ping <= LATENCY * 1000 + 15)
+    _expect(checks, f"джиттер {result['jitter_ms'] or 0:.1f} мс мал",
+            result["jitter_ms"] is not None and result["jitter_ms"] < 10)
+    _expect(checks, f"download {result['download_mbps'] or 0:.1f} Мбит/с около {RATE_MBPS:g}",
+            _plausible(result["download_mbps"], RATE_MBPS))
+    _expect(checks, f"upload {result['upload_mbps'] or 0:.1f} Мбит/с около {RATE_MBPS:g}",
+            _plausible(result["upload_mbps"], RATE_MBPS))
+    _expect(checks, "замер без ошибок", not result["errors"])
+
+
+def scenario_cache(fake: FakeSpeedServer, checks: List[Tuple[str, bool]]):
+    speedtest = _speedtest(fake, duration=2.0, warmup=0.5, cache_ttl=30.0)
+    first = speedtest.run()
+    requests_after_first = sum(fake.requests.values())
+    time.sleep(0.1)
+    cached = speedtest.run()
+    _expect(checks, "первый запуск проводит замер", first["age"] == 0.0)
+    _expect(checks, "в пределах TTL результат берется из кэша",
+            cached["age"] > 0 and cached["download_mbps"] == first["download_mbps"])
+    _expect(checks, "кэшированный результат не обращается к серверу",
+            sum(fake.requests.values()) == requests_after_first)
+    forced = speedtest.run(force=True)
+    _expect(checks, "force проводит новый замер",
+            forced["age"] == 0.0 and sum(fake.requests.values()) > requests_after_first)
+
+
+def scenario_budget(fake: FakeSpeedServer, checks: List[Tuple[str, bool]]):
+    fake.stall = True
+    budget = 5.0
+    result = _speedtest(fake, duration=8.0, budget=budget).measure()
+    _expect(checks, f"замер на зависшем сервере занял {result['duration']:.1f} с в пределах бюджета",
+            result["duration"] <= budget + UPLOAD_ACK_GRACE + 0.5)
+    _expect(checks, "зависший download не дает скорости", not result["download_mbps"])
+    _expect(checks, "upload без подтверждения сервера — N/A", result["upload_mbps"] is None)
+    fake.stall = False
+    # download получает половину остатка бюджета — меньше разгона, и фаза пропускается
+    result = _speedtest(fake, budget=2.0, warmup=1.5).measure()
+    _expect(checks, "при малом бюджете download пропускается",
+            result["download_mbps"] is None and "download: не хватило времени" in result["errors"])
+    _expect(checks, f"малый бюджет соблюден ({result['duration']:.1f} с)",
+            result["duration"] <= 2.0 + UPLOAD_ACK_GRACE + 0.5)
+
+
+SCENARIOS: List[Callable[[FakeSpeedServer, List[Tuple[str, bool]]], None]] = [
+    scenario_measure, scenario_cache, scenario_budget,
+]
+
+
+def main():
+    failed = 0
+    for scenario in SCENARIOS:
+        fake = FakeSpeedServer()
+        fake.start()
+        checks: List[Tuple[str, bool]] = []
+        started = time.monotonic()
+        try:
+            scenario(fake, checks)
+        except Exception as e:
+            checks.append((f"исключение {type(e).__name__}: {e}", False))
+        finally:
+            fake.stop()
+        print(f"{scenario.__name__} ({(time.monotonic() - started) * 1000:.0f} мс)")
+        for name, ok in checks:
+            print(f"  {'✅' if ok else '❌'} {name}")
+            failed += not ok
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
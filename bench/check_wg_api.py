@@ -0,0 +1,104 @@
+"""
+Проверка клиента API wg-easy на заглушке: python -m bench.check_wg_api
+Вход по паролю, условный запрос списка (304 по ETag), повторный вход после 401,
+ошибки при недоступном сервере
+"""
+
+import sys
+import time
+from typing import Callable, List, Tuple
+
+from app.wg_api import WGEasyAPI, WGEasyAPIError
+
+from .fakes import FakeWGEasy
+
+PASSWORD = "secret"
+
+
+def _expect(checks: List[Tuple[str, bool]], name: str, condition: bool):
+    checks.append((name, condition))
+
+
+def scenario_login(fake: FakeWGEasy, checks: List[Tuple[str, bool]]):
+    api = WGEasyAPI(fake.url, PASSWORD)
+    fake.add_client("alice")
+    clients = api.list_clients()
+    _expect(checks, "вход выполняется один раз перед первым запросом", fake.logins == 1)
+    _expect(checks, "список клиентов получен", [c["name"] for c in clients] == ["alice"])
+    api.list_clients(force=True)
+    _expect(checks, "сессия переиспользуется", fake.logins == 1)
+    try:
+        WGEasyAPI(fake.url, "wrong").list_clients()
+        _expect(checks, "неверный пароль дает ошибку", False)
+    except WGEasyAPIError as e:
+        _expect(checks, "неверный пароль дает ошибку", e.status == 401)
+
+
+def scenario_etag(fake: FakeWGEasy, checks: List[Tuple[str, bool]]):
+    api = WGEasyAPI(fake.url, PASSWORD, cache_ttl=0)
+    first = api.list_clients()
+    second = api.list_clients()
+    _expect(checks, "повторный запрос получает 304 по ETag", fake.not_modified == 1)
+    _expect(checks, "после 304 отдается кэшированный список", second == first)
+    fake.add_client("bob")
+    third = api.list_clients()
+    _expect(checks, "после изменения приходит новый список", len(third) == len(first) + 1)
+    cached = WGEasyAPI(fake.url, PASSWORD, cache_ttl=60)
+    cached.list_clients()
+    before = sum(fake.requests.values())
+    cached.list_clients()
+    _expect(checks, "в пределах TTL запрос не отправляется", sum(fake.requests.values()) == before)
+    client_id = third[-1]["id"]
+    cached.set_enabled(client_id, False)
+    _expect(checks, "изменение сбрасывает кэш", cached.get_client(client_id)["enabled"] is False)
+
+
+def scenario_relogin(fake: FakeWGEasy, checks: List[Tuple[str, bool]]):
+    api = WGEasyAPI(fake.url, PASSWORD, cache_ttl=0)
+    fake.add_client("carol")
+    api.list_clients()
+    logins = fake.logins
+    fake.expire_sessions()
+    clients = api.list_clients()
+    _expect(checks, "после 401 бот входит заново", fake.logins == logins + 1)
+    _expect(checks, "запрос после повторного входа успешен", isinstance(clients, list))
+    config = api.get_config(clients[0]["id"])
+    _expect(checks, "конфигурация клиента скачивается", config.startswith(b"[Interface]"))
+
+
+def scenario_errors(fake: FakeWGEasy, checks: List[Tuple[str, bool]]):
+    fake.stop()
+    try:
+        WGEasyAPI(fake.url, PASSWORD, timeout=1).list_clients()
+        _expect(checks, "недоступный wg-easy дает WGEasyAPIError", False)
+    except WGEasyAPIError:
+        _expect(checks, "недоступный wg-easy дает WGEasyAPIError", True)
+
+
+SCENARIOS: List[Callable[[FakeWGEasy, List[Tuple[str, bool]]], None]] = [
+    scenario_login, scenario_etag, scenario_relogin, scenario_errors,
+]
+
+
+def main():
+    failed = 0
+    for scenario in SCENARIOS:
+        fake = FakeWGEasy(PASSWORD)
+        fake.start()
+        checks: List[Tuple[str, bool]] = []
+        started = time.monotonic()
+        try:
+            scenario(fake, checks)
+        except Exception as e:
+            checks.append((f"исключение {type(e).__name__}: {e}", False))
+        finally:
+            fake.stop()
+        print(f"{scenario.__name__} ({(time.monotonic() - started) * 1000:.0f} мс)")
+        for name, ok in checks:
+            print(f"  {'✅' if ok else '❌'} {name}")
+            failed += not ok
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
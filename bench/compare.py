@@ -0,0 +1,55 @@
+"""
+Сравнение двух результатов бенчмарка: python -m bench.compare base.json new.json
+"""
+
+import json
+import sys
+from typing import Any, Dict, List, Optional
+
+
+def _delta(old: Optional[float], new: Optional[float]) -> str:
+    if old is None or new is None:
+        return "—"
+    if old == 0:
+        return "—" if new == 0 else "+∞"
+    return f"{(new - old) / old * 100:+.1f}%"
+
+
+def _row(label: str, old: Optional[float], new: Optional[float]) -> str:
+    show = lambda value: "—" if value is None else f"{value:g}"
+    return f"  {label:<24}{show(old):>12}{show(new):>12}{_delta(old, new):>10}"
+
+
+def compare(base: Dict[str, Any], new: Dict[str, Any]) -> List[str]:
+    """Строки таблицы: значение в базе, в новом прогоне и изменение"""
+    lines = [f"база {base['meta'].get('revision') or '?'} -> {new['meta'].get('revision') or '?'}",
+             _row("запуск, с", base.get("startup_seconds"), new.get("startup_seconds")),
+             "простой:"]
+    for key in ("cpu_ms_per_cycle", "docker_requests_per_cycle", "cpu_percent", "rss_kb"):
+        lines.append(_row(key, base["idle"].get(key), new["idle"].get(key)))
+    phases = {phase["rate"]: phase for phase in base["phases"]}
+    for phase in new["phases"]:
+        old = phases.get(phase["rate"])
+        if old is None:
+            continue
+        lines.append(f"нагрузка {phase['rate']:g}/с:")
+        for key in ("p50", "p90", "p99", "max"):
+            lines.append(_row(f"latency {key}, мс", old["latency_ms"][key], phase["latency_ms"][key]))
+        for key in ("throughput", "lost", "cpu_percent", "rss_kb_max"):
+            lines.append(_row(key, old.get(key), phase.get(key)))
+    return lines
+
+
+def main():
+    if len(sys.argv) != 3:
+        print("Использование: python -m bench.compare base.json new.json")
+        sys.exit(2)
+    with open(sys.argv[1]) as f:
+        base = json.load(f)
+    with open(sys.argv[2]) as f:
+        new = json.load(f)
+    print("\n".join(compare(base, new)))
+
+
+if __name__ == "__main__":
+    main()
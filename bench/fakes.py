@@ -0,0 +1,595 @@
+"""
+Локальные заменители Telegram Bot API, Docker Engine API, API wg-easy и сервера теста скорости
+Серверы ведут учет запросов, Telegram еще и фиксирует время каждого ответа бота
+"""
+
+import hashlib
+import json
+import os
+import secrets
+import socket
+import socketserver
+import struct
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+# Методы, которыми бот отвечает пользователю
+REPLY_METHODS = {"sendMessage", "editMessageText", "sendDocument"}
+
+
+class FakeTelegram:
+    """Bot API на localhost: очередь обновлений для getUpdates и журнал ответов
+
+    on_reply(chat_id, method, monotonic_time) вызывается на каждый ответ бота.
+    Все пути вне /bot<token>/ отвечают 200 — это «веб-интерфейс wg-easy».
+    """
+
+    def __init__(self, on_reply: Callable[[int, str, float], None], latency: float = 0.0,
+                 host: str = "127.0.0.1", port: int = 0):
+        self.on_reply = on_reply
+        self.latency = latency
+        self.requests: Counter = Counter()
+        self._updates: Deque[Dict[str, Any]] = deque()
+        self._next_id = 1
+        self._message_id = 0
+        self._cond = threading.Condition()
+        # Момент первого long polling запроса: бот закончил запуск
+        self.polling = threading.Event()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        with self._cond:
+            self._cond.notify_all()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def push(self, payload: Dict[str, Any]) -> int:
+        """Поставить обновление (message или callback_query) в очередь; вернуть update_id"""
+        with self._cond:
+            update_id = self._next_id
+            self._next_id += 1
+            self._updates.append(dict(payload, update_id=update_id))
+            self._cond.notify_all()
+        return update_id
+
+    def _get_updates(self, offset: int, timeout: float, limit: int) -> List[Dict[str, Any]]:
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            # Подтвержденные (update_id < offset) больше не нужны
+            while self._updates and self._updates[0]["update_id"] < offset:
+                self._updates.popleft()
+            while not self._updates:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return []
+                self._cond.wait(remaining)
+                while self._updates and self._updates[0]["update_id"] < offset:
+                    self._updates.popleft()
+            return list(self._updates)[:limit]
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Заголовки и тело уходят отдельными записями: без этого Nagle добавляет ~40 мс
+            disable_nagle_algorithm = True
+
+            def _reply(self, code: int, payload: Any):
+                body = json.dumps(payload).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _params(self) -> Dict[str, str]:
+                url = urlparse(self.path)
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length) if length else b""
+                if self.headers.get("Content-Type", "").startswith("application/x-www-form-urlencoded"):
+                    params.update({k: v[0] for k, v in parse_qs(body.decode()).items()})
+                elif b'name="chat_id"' in body:
+                    # multipart (sendDocument): достаточно chat_id
+                    chunk = body.split(b'name="chat_id"', 1)[1].split(b"\r\n\r\n", 1)[1]
+                    params["chat_id"] = chunk.split(b"\r\n", 1)[0].decode()
+                return params
+
+            def _handle(self):
+                parts = urlparse(self.path).path.split("/")
+                params = self._params()
+                if len(parts) < 3 or not parts[1].startswith("bot"):
+                    self._reply(200, {"status": "ok"})
+                    return
+                method = parts[2]
+                with fake._cond:
+                    fake.requests[method] += 1
+                if method == "getUpdates":
+                    timeout = float(params.get("timeout", 0))
+                    if timeout > 0:
+                        fake.polling.set()
+                    result = fake._get_updates(int(params.get("offset", 0)), timeout,
+                                               int(params.get("limit", 100)))
+                    self._reply(200, {"ok": True, "result": result})
+                    return
+                if fake.latency:
+                    time.sleep(fake.latency)
+                if method in REPLY_METHODS and "chat_id" in params:
+                    fake.on_reply(int(params["chat_id"]), method, time.monotonic())
+                with fake._cond:
+                    fake._message_id += 1
+                    message_id = fake._message_id
+                self._reply(200, {"ok": True, "result": {"message_id": message_id} if method in REPLY_METHODS else True})
+
+            do_GET = _handle
+            do_POST = _handle
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def wg_dump(peers: int) -> str:
+    """Вывод `wg show all dump` с заданным числом пиров; счетчики растут со временем"""
+    now = int(time.time())
+    lines = ["wg0\tPRIVATE\tPUBLIC\t51820\toff"]
+    for index in range(peers):
+        traffic = (now % 100000) * (index + 1) * 1000
+        lines.append(f"wg0\tpeer{index:05d}=\t(none)\t10.{index // 250}.{index % 250}.1:51820\t"
+                     f"10.8.{index // 250}.{index % 250 + 2}/32\t{now - index % 300}\t{traffic}\t{traffic // 2}\toff")
+    return "\n".join(lines) + "\n"
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class FakeDocker:
+    """Docker Engine API на unix-сокете с одним запущенным контейнером
+
+    latency добавляется к каждому обычному запросу, exec `wg show` отдает
+    дамп на peers пиров, поток логов выдает log_rate строк в секунду.
+    """
+
+    def __init__(self, socket_path: str, container: str = "wg-easy", latency: float = 0.0,
+                 peers: int = 50, log_rate: float = 0.0):
+        self.socket_path = socket_path
+        self.container = container
+        self.latency = latency
+        self.peers = peers
+        self.log_rate = log_rate
+        self.requests: Counter = Counter()
+        self._execs: Dict[str, List[str]] = {}
+        self._exec_seq = 0
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        self.server = _UnixHTTPServer(socket_path, self._handler())
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+        self.server.shutdown()
+        self.server.server_close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def address_string(self):
+                return "unix"
+
+            def _json(self, payload: Any, code: int = 200):
+                body = json.dumps(payload).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _chunk(self, data: bytes):
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+
+            def _stream_start(self, content_type: str):
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+            def _count(self, kind: str):
+                with fake._lock:
+                    fake.requests[kind] += 1
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                path = url.path.lstrip("/")
+                query = {k: v[0] for k, v in parse_qs(url.query).items()}
+                if path == "_ping":
+                    self._count("ping")
+                    body = b"OK"
+                    self.send_response(200)
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                elif path == "containers/json":
+                    self._count("list")
+                    time.sleep(fake.latency)
+                    self._json([{"Id": "f" * 64, "Names": [f"/{fake.container}"],
+                                 "Status": "Up 2 hours (healthy)"}])
+                elif path.startswith("containers/") and path.endswith("/json"):
+                    self._count("inspect")
+                    time.sleep(fake.latency)
+                    self._json({"Id": "f" * 64, "State": {"Running": True, "Pid": 0},
+                                "Config": {"Tty": False}})
+                elif path.startswith("exec/") and path.endswith("/json"):
+                    self._count("exec_inspect")
+                    self._json({"Running": False, "ExitCode": 0})
+                elif path.startswith("containers/") and path.endswith("/logs"):
+                    self._count("logs")
+                    self._logs(query)
+                elif path == "events":
+                    self._count("events")
+                    self._stream_start("application/json")
+                    fake._stopped.wait()
+                else:
+                    self._json({"message": f"page not found: {path}"}, 404)
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                path = url.path.lstrip("/")
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}") if length else {}
+                if path.endswith("/exec"):
+                    self._count("exec_create")
+                    time.sleep(fake.latency)
+                    with fake._lock:
+                        fake._exec_seq += 1
+                        exec_id = f"exec{fake._exec_seq}"
+                        fake._execs[exec_id] = body.get("Cmd", [])
+                    self._json({"Id": exec_id}, 201)
+                elif path.startswith("exec/") and path.endswith("/start"):
+                    self._count("exec_start")
+                    time.sleep(fake.latency)
+                    with fake._lock:
+                        cmd = fake._execs.pop(path.split("/")[1], [])
+                    output = wg_dump(fake.peers) if cmd[:2] == ["wg", "show"] else "PID USER COMMAND\n1 root node\n"
+                    data = output.encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/vnd.docker.raw-stream")
+                    self.end_headers()
+                    self.wfile.write(struct.pack(">BxxxI", 1, len(data)) + data)
+                    self.close_connection = True
+                elif path.endswith("/restart"):
+                    self._count("restart")
+                    self.send_response(204)
+                    self.end_headers()
+                else:
+                    self._json({"message": f"page not found: {path}"}, 404)
+
+            def _logs(self, query: Dict[str, str]):
+                self._stream_start("application/vnd.docker.multiplexed-stream")
+
+                def send(text: str):
+                    stamp = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime()) + f".{time.time_ns() % 10**9:09d}Z"
+                    data = f"{stamp} {text}\n".encode()
+                    self._chunk(struct.pack(">BxxxI", 1, len(data)) + data)
+
+                try:
+                    tail = query.get("tail", "all")
+                    for index in range(100 if tail == "all" else int(tail)):
+                        send(f"info: history line {index}")
+                    if query.get("follow") == "1":
+                        index = 0
+                        interval = 1 / fake.log_rate if fake.log_rate > 0 else None
+                        while not fake._stopped.wait(interval if interval else 1):
+                            if interval:
+                                index += 1
+                                send(f"info: request {index} handled in {index % 97} ms")
+                    self.wfile.write(b"0\r\n\r\n")
+                except OSError:
+                    self.close_connection = True
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+class FakeWGEasy:
+    """REST API wg-easy на localhost: вход по паролю, cookie сессии, ETag у списка клиентов
+
+    expire_sessions() имитирует истекшую сессию — следующий запрос получит 401.
+    """
+
+    def __init__(self, password: str = "", host: str = "127.0.0.1", port: int = 0):
+        self.password = password
+        self.requests: Counter = Counter()
+        self.logins = 0
+        self.not_modified = 0
+        self.clients: Dict[str, Dict[str, Any]] = {}
+        self._sessions: set = set()
+        self._seq = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def expire_sessions(self):
+        with self._lock:
+            self._sessions.clear()
+
+    def add_client(self, name: str) -> str:
+        with self._lock:
+            self._seq += 1
+            client_id = f"client-{self._seq}"
+            self.clients[client_id] = {"id": client_id, "name": name, "enabled": True,
+                                       "address": f"10.8.0.{self._seq + 1}"}
+            return client_id
+
+    def etag(self) -> str:
+        with self._lock:
+            digest = hashlib.sha1(json.dumps(self.clients, sort_keys=True).encode()).hexdigest()
+        return f'"{digest[:16]}"'
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def _send(self, code: int, body: bytes = b"", content_type: str = "application/json",
+                      headers: Optional[Dict[str, str]] = None):
+                self.send_response(code)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _authorized(self) -> bool:
+                if not fake.password:
+                    return True
+                cookies = dict(part.strip().split("=", 1) for part in self.headers.get("Cookie", "").split(";")
+                               if "=" in part)
+                with fake._lock:
+                    return cookies.get("connect.sid") in fake._sessions
+
+            def _handle(self, method: str):
+                path = urlparse(self.path).path
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}") if length else {}
+                with fake._lock:
+                    fake.requests[f"{method} {path}"] += 1
+                if path == "/api/session" and method == "POST":
+                    if body.get("password") != fake.password:
+                        self._send(401, b'{"error": "Incorrect Password"}')
+                        return
+                    token = secrets.token_hex(8)
+                    with fake._lock:
+                        fake._sessions.add(token)
+                        fake.logins += 1
+                    self._send(204, headers={"Set-Cookie": f"connect.sid={token}; Path=/; HttpOnly"})
+                    return
+                if not path.startswith("/api/wireguard/client"):
+                    self._send(200, b"wg-easy", "text/html")
+                    return
+                if not self._authorized():
+                    self._send(401, b'{"error": "Not Logged In"}')
+                    return
+                parts = path[len("/api/wireguard/client"):].strip("/").split("/")
+                client_id = parts[0] if parts[0] else None
+                if client_id is None:
+                    if method == "GET":
+                        etag = fake.etag()
+                        if self.headers.get("If-None-Match") == etag:
+                            with fake._lock:
+                                fake.not_modified += 1
+                            self._send(304, headers={"ETag": etag})
+                            return
+                        with fake._lock:
+                            payload = json.dumps(list(fake.clients.values())).encode()
+                        self._send(200, payload, headers={"ETag": etag})
+                    elif method == "POST":
+                        fake.add_client(body.get("name", ""))
+                        self._send(200, b'{"success": true}')
+                    else:
+                        self._send(405)
+                    return
+                with fake._lock:
+                    client = fake.clients.get(client_id)
+                    if client is not None and method == "DELETE":
+                        del fake.clients[client_id]
+                    elif client is not None and len(parts) > 1 and parts[1] in ("enable", "disable"):
+                        client["enabled"] = parts[1] == "enable"
+                if client is None:
+                    self._send(404, b'{"error": "Client Not Found"}')
+                elif len(parts) > 1 and parts[1] == "configuration":
+                    self._send(200, f"[Interface]\nAddress = {client['address']}/24\n".encode(), "text/plain")
+                elif len(parts) > 1 and parts[1] == "qrcode.svg":
+                    self._send(200, b"<svg/>", "image/svg+xml")
+                else:
+                    self._send(200, b'{"success": true}')
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_POST(self):
+                self._handle("POST")
+
+            def do_DELETE(self):
+                self._handle("DELETE")
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+class FakeSpeedServer:
+    """Эндпоинты теста скорости в духе speed.cloudflare.com на localhost
+
+    GET /__down?bytes=N отдает N байт, /__down?bytes=0 служит для замера задержки,
+    POST /__up принимает тело. Каждый ответ задерживается на latency, а download и
+    upload делят между потоками общий канал rate_mbps в каждую сторону. При stall
+    download зависает после заголовков, а upload принимает тело, но не отвечает.
+    """
+
+    def __init__(self, latency: float = 0.0, rate_mbps: float = 40.0, stall: bool = False,
+                 host: str = "127.0.0.1", port: int = 0):
+        self.latency = latency
+        self.rate_mbps = rate_mbps
+        self.stall = stall
+        self.requests: Counter = Counter()
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self._free_at = {"down": 0.0, "up": 0.0}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _pace(self, direction: str, size: int):
+        """Дождаться, пока общий канал в направлении direction пропустит size байт"""
+        with self._lock:
+            start = max(time.monotonic(), self._free_at[direction])
+            self._free_at[direction] = start + size * 8 / (self.rate_mbps * 1_000_000)
+            wait = self._free_at[direction] - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+
+    def _handler(self):
+        fake = self
+        chunk = b"\0" * 64 * 1024
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                # Маленький буфер приема: upload упирается в темп чтения, а не в память ядра
+                self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 64 * 1024)
+
+            def _count(self, name: str, size: int = 0):
+                with fake._lock:
+                    if name:
+                        fake.requests[name] += 1
+                    if self.command == "GET":
+                        fake.bytes_sent += size
+                    else:
+                        fake.bytes_received += size
+
+            def _read_body(self) -> Iterator[bytes]:
+                if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+                    while True:
+                        size = int(self.rfile.readline().split(b";", 1)[0].strip() or b"0", 16)
+                        if size == 0:
+                            self.rfile.readline()
+                            return
+                        yield self.rfile.read(size)
+                        self.rfile.readline()
+                remaining = int(self.headers.get("Content-Length", 0))
+                while remaining > 0:
+                    data = self.rfile.read(min(remaining, len(chunk)))
+                    if not data:
+                        return
+                    remaining -= len(data)
+                    yield data
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                size = int(parse_qs(url.query).get("bytes", ["0"])[0])
+                self._count("ping" if size == 0 else "download")
+                time.sleep(fake.latency)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(size))
+                self.end_headers()
+                if size and fake.stall:
+                    fake._stopped.wait()
+                    return
+                try:
+                    while size > 0 and not fake._stopped.is_set():
+                        part = chunk[:size]
+                        fake._pace("down", len(part))
+                        self.wfile.write(part)
+                        self._count("", len(part))
+                        size -= len(part)
+                except OSError:
+                    self.close_connection = True
+
+            def do_POST(self):
+                self._count("upload")
+                received = 0
+                try:
+                    for data in self._read_body():
+                        fake._pace("up", len(data))
+                        self._count("", len(data))
+                        received += len(data)
+                except (OSError, ValueError):
+                    self.close_connection = True
+                    return
+                if fake.stall:
+                    fake._stopped.wait()
+                    return
+                time.sleep(fake.latency)
+                body = json.dumps({"received": received}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
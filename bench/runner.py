@@ -0,0 +1,374 @@
+"""
+Прогон бенчмарка: бот запускается отдельным процессом (`python -m app.main`)
+против локальных заглушек Telegram и Docker. Сначала фаза простоя (только
+проверки), затем фазы нагрузки с заданной частотой обновлений
+"""
+
+import json
+import os
+import platform
+import random
+import re
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import requests
+
+from app.speedtest import percentile
+
+from .fakes import FakeDocker, FakeTelegram
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ADMIN_ID = 1
+FIRST_CHAT = 1001
+# Команды с одним ответом: время до первого ответа однозначно относится к обновлению
+DEFAULT_MIX = ("/start", "/status", "/peers", "/top", "/history", "/logs", "cb:status", "cb:peers:0")
+_SAMPLE = re.compile(r'^(\w+?)(_sum|_count)(\{[^}]*\})? ([0-9.eE+-]+)$')
+
+
+class ReplyTracker:
+    """Сопоставляет ответы бота с отправленными обновлениями (FIFO по чату)"""
+
+    def __init__(self):
+        self._pending: Dict[int, Deque[Tuple[float, str]]] = defaultdict(deque)
+        self._lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.reply_times: Dict[str, List[float]] = defaultdict(list)
+        self.unmatched = 0
+        self.alerts = 0
+
+    def sent(self, chat_id: int, phase: str, now: float):
+        with self._lock:
+            self._pending[chat_id].append((now, phase))
+
+    def on_reply(self, chat_id: int, method: str, now: float):
+        with self._lock:
+            if chat_id == ADMIN_ID:
+                self.alerts += 1
+                return
+            pending = self._pending.get(chat_id)
+            if not pending:
+                self.unmatched += 1
+                return
+            sent_at, phase = pending.popleft()
+            self.latencies[phase].append(now - sent_at)
+            self.reply_times[phase].append(now)
+
+    def outstanding(self, phase: str) -> int:
+        with self._lock:
+            return sum(1 for queue in self._pending.values() for _, p in queue if p == phase)
+
+    def abandon(self, phase: str) -> int:
+        """Забыть неотвеченные обновления фазы, чтобы поздние ответы не попали в следующую"""
+        with self._lock:
+            lost = 0
+            for chat_id, queue in self._pending.items():
+                kept = deque(item for item in queue if item[1] != phase)
+                lost += len(queue) - len(kept)
+                self._pending[chat_id] = kept
+            return lost
+
+
+class ProcessSampler:
+    """RSS и загрузка CPU процесса по /proc раз в interval секунд"""
+
+    def __init__(self, pid: int, interval: float = 1.0):
+        self.pid = pid
+        self.interval = interval
+        self.series: List[Dict[str, Any]] = []
+        self.phase = "startup"
+        self._tick = os.sysconf("SC_CLK_TCK")
+        self._stopped = threading.Event()
+        self._started = time.monotonic()
+
+    def cpu_seconds(self) -> float:
+        with open(f"/proc/{self.pid}/stat") as f:
+            # Имя процесса в скобках может содержать пробелы
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / self._tick
+
+    def rss_kb(self) -> int:
+        with open(f"/proc/{self.pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+        return 0
+
+    def start(self):
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _loop(self):
+        previous = (time.monotonic(), self.cpu_seconds())
+        while not self._stopped.wait(self.interval):
+            try:
+                now, cpu = time.monotonic(), self.cpu_seconds()
+                rss = self.rss_kb()
+            except (OSError, ValueError, IndexError):
+                return
+            self.series.append({
+                "t": round(now - self._started, 2),
+                "phase": self.phase,
+                "rss_kb": rss,
+                "cpu_percent": round((cpu - previous[1]) / (now - previous[0]) * 100, 1),
+            })
+            previous = (now, cpu)
+
+
+def scrape(url: str) -> Dict[str, float]:
+    """Суммы и счетчики гистограмм с /metrics бота: {"имя_sum{метки}": значение}"""
+    values: Dict[str, float] = {}
+    try:
+        text = requests.get(url, timeout=5).text
+    except requests.RequestException:
+        return values
+    for line in text.splitlines():
+        match = _SAMPLE.match(line)
+        if match:
+            name, suffix, labels, value = match.groups()
+            values[f"{name}{suffix}{labels or ''}"] = float(value)
+    return values
+
+
+def histogram_means(before: Dict[str, float], after: Dict[str, float], name: str) -> Dict[str, Dict[str, float]]:
+    """Число наблюдений и среднее (мс) по меткам гистограммы между двумя снимками"""
+    result = {}
+    for key, count in after.items():
+        if not key.startswith(f"{name}_count"):
+            continue
+        labels = key[len(f"{name}_count"):]
+        delta = count - before.get(key, 0)
+        if delta <= 0:
+            continue
+        total = after.get(f"{name}_sum{labels}", 0) - before.get(f"{name}_sum{labels}", 0)
+        label = ",".join(part.split("=", 1)[1].strip('"') for part in labels.strip("{}").split(",") if part)
+        result[label or "all"] = {"count": int(delta), "mean_ms": round(total / delta * 1000, 3)}
+    return result
+
+
+def summarize(values: List[float]) -> Dict[str, Optional[float]]:
+    """Перцентили задержки в миллисекундах"""
+    if not values:
+        return {"p50": None, "p90": None, "p99": None, "max": None, "mean": None}
+    ms = [value * 1000 for value in values]
+    return {
+        "p50": round(percentile(ms, 50), 2),
+        "p90": round(percentile(ms, 90), 2),
+        "p99": round(percentile(ms, 99), 2),
+        "max": round(max(ms), 2),
+        "mean": round(sum(ms) / len(ms), 2),
+    }
+
+
+def make_update(kind: str, chat_id: int, seq: int) -> Dict[str, Any]:
+    """Синтетическое обновление: текст команды или cb:<data> для нажатия кнопки"""
+    chat = {"id": chat_id, "type": "private"}
+    if kind.startswith("cb:"):
+        return {"callback_query": {
+            "id": str(seq), "from": {"id": chat_id}, "data": kind[3:],
+            "message": {"message_id": seq, "chat": chat, "date": int(time.time())},
+        }}
+    return {"message": {"message_id": seq, "from": {"id": chat_id}, "chat": chat,
+                        "date": int(time.time()), "text": kind}}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                              capture_output=True, text=True, timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+class Benchmark:
+    """Один прогон с заданными параметрами; run() возвращает результаты для JSON"""
+
+    def __init__(self, rates: List[float], duration: float = 20, idle: float = 15,
+                 drain: float = 15, chats: int = 50, mix: Tuple[str, ...] = DEFAULT_MIX,
+                 probe_interval: int = 2, peers: int = 50, docker_latency: float = 0.0,
+                 telegram_latency: float = 0.0, log_rate: float = 5.0, log_watch: bool = True,
+                 sample_interval: float = 1.0, seed: int = 1, env: Optional[Dict[str, str]] = None):
+        self.rates = rates
+        self.duration = duration
+        self.idle = idle
+        self.drain = drain
+        self.chats = chats
+        self.mix = mix
+        self.probe_interval = probe_interval
+        self.peers = peers
+        self.docker_latency = docker_latency
+        self.telegram_latency = telegram_latency
+        self.log_rate = log_rate
+        self.log_watch = log_watch
+        self.sample_interval = sample_interval
+        self.seed = seed
+        self.extra_env = env or {}
+        self.tracker = ReplyTracker()
+
+    def parameters(self) -> Dict[str, Any]:
+        return {
+            "rates": self.rates, "duration": self.duration, "idle": self.idle, "drain": self.drain,
+            "chats": self.chats, "mix": list(self.mix), "probe_interval": self.probe_interval,
+            "peers": self.peers, "docker_latency": self.docker_latency,
+            "telegram_latency": self.telegram_latency, "log_rate": self.log_rate,
+            "log_watch": self.log_watch, "seed": self.seed, "env": self.extra_env,
+        }
+
+    def _bot_env(self, workdir: str, telegram_url: str, socket_path: str, metrics_port: int) -> Dict[str, str]:
+        subscribers = [{"chat_id": FIRST_CHAT + index, "role": "admin", "name": f"bench{index}", "alerts": []}
+                       for index in range(self.chats)]
+        subscribers_file = os.path.join(workdir, "subscribers.json")
+        with open(subscribers_file, "w") as f:
+            json.dump(subscribers, f)
+        env = dict(os.environ)
+        env.update({
+            "TELEGRAM_TOKEN": "bench", "ADMIN_ID": str(ADMIN_ID), "TELEGRAM_API_URL": telegram_url,
+            "DOCKER_HOST": f"unix://{socket_path}", "WG_EASY_URL": f"{telegram_url}/wg",
+            "WG_EASY_CONTAINER": "wg-easy", "MONITOR_MODE": "poll",
+            # Постоянный интервал: без адаптивного увеличения циклов за фазу было бы мало
+            "MONITOR_INTERVAL": str(self.probe_interval), "PROBE_MAX_INTERVAL": str(self.probe_interval),
+            "POLL_TIMEOUT": "25", "SUBSCRIBERS_FILE": subscribers_file,
+            "STATE_FILE": os.path.join(workdir, "state.json"),
+            "METRICS_PORT": str(metrics_port), "METRICS_LISTEN": "127.0.0.1",
+            "LOG_WATCH": "true" if self.log_watch else "false",
+            "CGROUP_ROOT": os.path.join(workdir, "cgroup"), "TARGETS_FILE": "",
+            "PYTHONUNBUFFERED": "1",
+        })
+        env.update(self.extra_env)
+        return env
+
+    def run(self) -> Dict[str, Any]:
+        with tempfile.TemporaryDirectory(prefix="wgbot-bench-") as workdir:
+            telegram = FakeTelegram(self.tracker.on_reply, latency=self.telegram_latency)
+            docker = FakeDocker(os.path.join(workdir, "docker.sock"), latency=self.docker_latency,
+                                peers=self.peers, log_rate=self.log_rate)
+            telegram.start()
+            docker.start()
+            metrics_port = _free_port()
+            metrics_url = f"http://127.0.0.1:{metrics_port}/metrics"
+            log_path = os.path.join(workdir, "bot.log")
+            started = time.monotonic()
+            with open(log_path, "w") as log:
+                process = subprocess.Popen(
+                    [sys.executable, "-m", "app.main"], cwd=REPO_ROOT, stdout=log, stderr=subprocess.STDOUT,
+                    env=self._bot_env(workdir, telegram.url, docker.socket_path, metrics_port))
+            sampler = ProcessSampler(process.pid, self.sample_interval)
+            sampler.start()
+            try:
+                if not telegram.polling.wait(30) or process.poll() is not None:
+                    with open(log_path) as f:
+                        raise RuntimeError(f"Бот не запустился:\n{f.read()[-2000:]}")
+                startup = time.monotonic() - started
+                result = {
+                    "meta": {
+                        "revision": _git_revision(),
+                        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                        "python": platform.python_version(),
+                        "platform": platform.platform(),
+                        "cpus": os.cpu_count(),
+                    },
+                    "parameters": self.parameters(),
+                    "startup_seconds": round(startup, 3),
+                    "idle": self._idle_phase(sampler, docker, metrics_url),
+                    "phases": [self._load_phase(rate, telegram, sampler, metrics_url) for rate in self.rates],
+                }
+            finally:
+                sampler.stop()
+                process.send_signal(signal.SIGTERM)
+                try:
+                    process.wait(15)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                    process.wait()
+                docker.stop()
+                telegram.stop()
+            result["exit_code"] = process.returncode
+            result["alerts"] = self.tracker.alerts
+            result["unmatched_replies"] = self.tracker.unmatched
+            result["telegram_requests"] = dict(telegram.requests)
+            result["docker_requests"] = dict(docker.requests)
+            result["rss_series"] = sampler.series
+            return result
+
+    def _idle_phase(self, sampler: ProcessSampler, docker: FakeDocker, metrics_url: str) -> Dict[str, Any]:
+        """Только мониторинг: стоимость одного цикла проверки"""
+        sampler.phase = "idle"
+        # Первые проверки и сбор статуса при запуске в замер не попадают
+        time.sleep(min(2.0, self.idle))
+        before_metrics, before_cpu, before_docker = scrape(metrics_url), sampler.cpu_seconds(), sum(docker.requests.values())
+        started = time.monotonic()
+        time.sleep(self.idle)
+        elapsed = time.monotonic() - started
+        after_metrics, after_cpu, after_docker = scrape(metrics_url), sampler.cpu_seconds(), sum(docker.requests.values())
+        probes = histogram_means(before_metrics, after_metrics, "wgbot_probe_seconds")
+        cycles = probes.get("container_status", {}).get("count", 0)
+        cpu = after_cpu - before_cpu
+        return {
+            "seconds": round(elapsed, 2),
+            "cycles": cycles,
+            "probe_ms": probes,
+            "cpu_percent": round(cpu / elapsed * 100, 2),
+            "cpu_ms_per_cycle": round(cpu / cycles * 1000, 3) if cycles else None,
+            "docker_requests_per_cycle": round((after_docker - before_docker) / cycles, 2) if cycles else None,
+            "rss_kb": sampler.rss_kb(),
+        }
+
+    def _load_phase(self, rate: float, telegram: FakeTelegram, sampler: ProcessSampler,
+                    metrics_url: str) -> Dict[str, Any]:
+        """Обновления с постоянной частотой rate в секунду по кругу чатов"""
+        phase = f"rate_{rate:g}"
+        sampler.phase = phase
+        rng = random.Random(self.seed)
+        before_metrics, before_cpu = scrape(metrics_url), sampler.cpu_seconds()
+        rss_before = len(sampler.series)
+        count = max(1, int(rate * self.duration))
+        started = time.monotonic()
+        for index in range(count):
+            # Открытая модель нагрузки: расписание не ждет ответов бота
+            delay = started + index / rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            chat_id = FIRST_CHAT + index % self.chats
+            now = time.monotonic()
+            self.tracker.sent(chat_id, phase, now)
+            telegram.push(make_update(rng.choice(self.mix), chat_id, index + 1))
+        sent_done = time.monotonic()
+        deadline = sent_done + self.drain
+        while self.tracker.outstanding(phase) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        lost = self.tracker.abandon(phase)
+        ended = time.monotonic()
+        after_metrics, after_cpu = scrape(metrics_url), sampler.cpu_seconds()
+        latencies = self.tracker.latencies.get(phase, [])
+        replies = self.tracker.reply_times.get(phase, [])
+        window = (max(replies) - started) if replies else 0
+        rss = [point["rss_kb"] for point in sampler.series[rss_before:]] or [sampler.rss_kb()]
+        return {
+            "rate": rate,
+            "sent": count,
+            "replied": len(latencies),
+            "lost": lost,
+            "send_seconds": round(sent_done - started, 2),
+            "throughput": round(len(replies) / window, 2) if window > 0 else None,
+            "latency_ms": summarize(latencies),
+            "handler_ms": histogram_means(before_metrics, after_metrics, "wgbot_handler_seconds"),
+            "telegram_ms": histogram_means(before_metrics, after_metrics, "wgbot_telegram_request_seconds"),
+            "probe_ms": histogram_means(before_metrics, after_metrics, "wgbot_probe_seconds"),
+            "cpu_percent": round((after_cpu - before_cpu) / (ended - started) * 100, 2),
+            "rss_kb_max": max(rss),
+        }